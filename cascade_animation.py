@@ -0,0 +1,320 @@
+"""
+Animated cascaded exploding bar-charts
+
+Animates a cascade through a list of snapshots, e.g. the runtime breakdown
+of successive software versions. The chart is drawn once, every frame moves
+the existing bar, wedge and label artists (CascadeArtists.set_layout) to a
+layout interpolated between two snapshots: box heights, wedge vertices,
+label positions and colors move smoothly. Boxes and labels are matched
+between snapshots on stack and label, the ones that appear or disappear
+switch halfway the transition. The animation uses blitting, the limits of
+the Axes are fixed to fit all the snapshots.
+
+Usage:
+
+    snapshots = [data_v1, data_v2, {"data": data_v3, "emphasis": emphasis_v3}]
+    animation = CascadeAnimation(ax, snapshots, emphasis, bar_labels,
+                                 "percentage", steps=15)
+    chart_makeup(ax, "Runtime per version")
+    animation.save("versions.gif", fps=20)    # or "frames/frame_%04d.png"
+    plt.show()                                # or play it interactively
+
+The gif and png writers stream each frame to disk when it is rendered, so
+memory use does not depend on the number of frames. Without pyplot:
+
+    save_animation("versions.gif", snapshots, emphasis, bar_labels, steps=15)
+"""
+import io
+import os
+
+import numpy
+from matplotlib.animation import AbstractMovieWriter, FuncAnimation
+from PIL import GifImagePlugin, Image
+
+import cascadedexplodingbarcharts as cebc
+
+
+# The fields matching the entries of a component between two layouts, the
+# n-th entry with the same values is matched with the n-th one
+_match_fields = {"boxes": ("stack", "label"),
+                 "box_labels": ("stack", "text"),
+                 "bar_labels": ("stack",),
+                 "relative_bars": ("stack",),
+                 "explode_lines": ("stack",),
+                 "explode_labels": ("wedge",),
+                 "explode_bgs": ("wedge",)}
+
+
+def _entry_keys(component, arrays):
+    counts = {}
+    keys = []
+    for key in zip(*(arrays[field].tolist()
+                     for field in _match_fields[component])):
+        count = counts.get(key, 0)
+        counts[key] = count + 1
+        keys.append(key + (count,))
+    return keys
+
+
+def _matches(component, arrays, other):
+    """
+    Helper function returning for each entry of arrays the index of the
+    matching entry in other, -1 without match
+    """
+    index = dict((key, idx) for idx, key in
+                 enumerate(_entry_keys(component, other)))
+    return [index.get(key, -1) for key in _entry_keys(component, arrays)]
+
+
+class LayoutTransition(object):
+    """
+    The transition between two CascadeLayouts, at(fraction) returns the
+    layout in between. The matching of the entries is done once.
+    """
+
+    def __init__(self, old, new):
+        self.old = old
+        self.new = new
+        # The matches from old to new and from new to old
+        self.matches = {}
+        for nearest, other in ((old, new), (new, old)):
+            for component in cebc.CascadeLayout.fields:
+                matches = numpy.array(
+                    _matches(component, getattr(nearest, component),
+                             getattr(other, component)), dtype=numpy.intp)
+                self.matches[nearest is new, component] = matches
+
+    def at(self, fraction):
+        """
+        Returns the layout at fraction (0: old, 1: new): the coordinates and
+        colors of matched entries are interpolated linearly, the texts and
+        the entries without match are those of the nearest layout
+        """
+        if fraction <= 0:
+            return self.old
+        if fraction >= 1:
+            return self.new
+        to_new = fraction >= .5
+        nearest, other = (self.new, self.old) if to_new else \
+                         (self.old, self.new)
+        components = {}
+        for component, fields in cebc.CascadeLayout.fields.items():
+            arrays = getattr(nearest, component)
+            other_arrays = getattr(other, component)
+            matches = self.matches[to_new, component]
+            matched = matches >= 0
+            interpolated = dict(arrays)
+            for field, dtype, _ in fields:
+                if dtype is not float:
+                    continue
+                values = arrays[field].copy()
+                start = values[matched]
+                end = other_arrays[field][matches[matched]]
+                if to_new:
+                    start, end = end, start
+                values[matched] = start + (end - start) * fraction
+                interpolated[field] = values
+            components[component] = interpolated
+        return cebc.CascadeLayout(nearest.n_stacks, nearest.representation,
+                                  nearest.dpi, **components)
+
+
+def interpolate_layout(old, new, fraction):
+    """
+    Returns the CascadeLayout at fraction between old (0) and new (1), see
+    LayoutTransition
+    """
+    return LayoutTransition(old, new).at(fraction)
+
+
+class CascadeAnimation(object):
+    """
+    Animation of a cascade through snapshots, on ax
+
+    snapshots: list of the data of each snapshot (as for
+            cascaded_exploding_barcharts) or dicts with the data and
+            optionally the emphasis and bar_labels of that snapshot
+    emphasis, bar_labels: the defaults for the snapshots
+    representation, batch, lod, style: see cascaded_exploding_barcharts
+    steps:  frames per transition between two snapshots
+    hold:   extra frames showing each snapshot
+    interval: milliseconds between the frames when playing
+    repeat: restart the animation at the end when playing
+
+    handle: the CascadeArtists of the chart
+    animation: the matplotlib FuncAnimation, keep a reference to the
+            CascadeAnimation as long as the animation is needed
+    """
+
+    def __init__(self, ax, snapshots, emphasis=None, bar_labels=None,
+                 representation=None, steps=10, hold=0, interval=50,
+                 repeat=True, batch=None, lod=None, style=None):
+        self.ax = ax
+        self.style = cebc.cascade_style(style)
+        self.interval = interval
+        self.layouts = []
+        for snapshot in snapshots:
+            if not isinstance(snapshot, dict):
+                snapshot = {"data": snapshot}
+            snapshot_emphasis = snapshot.get("emphasis", emphasis)
+            snapshot_labels = snapshot.get("bar_labels", bar_labels)
+            if snapshot_labels is None:
+                snapshot_labels = [None] * len(snapshot["data"])
+            self.layouts.append(cebc._axes_cascade_layout(
+                ax, snapshot["data"], snapshot_emphasis, snapshot_labels,
+                representation, lod, style=self.style))
+        if not self.layouts:
+            raise ValueError("no snapshots to animate")
+
+        # (snapshot, fraction of the transition to the next) of each frame
+        self.frames = []
+        for idx in range(len(self.layouts) - 1):
+            self.frames.extend((idx, 0.) for _ in range(hold))
+            self.frames.extend((idx, step / float(steps))
+                               for step in range(steps))
+        self.frames.extend((len(self.layouts) - 1, 0.)
+                           for _ in range(hold + 1))
+        self._transitions = {}
+
+        self.handle = cebc.render_cascade_layout(ax, self.layouts[0], batch,
+                                                 style=self.style)
+        # Fixed limits fitting all snapshots, the blitted background can not
+        # change
+        for layout in self.layouts:
+            bounds = layout.bounds()
+            if bounds is not None:
+                ax.update_datalim(bounds)
+        ax.autoscale_view()
+        ax.set_autoscale_on(False)
+
+        self.animation = FuncAnimation(
+            ax.figure, self._draw_frame, frames=len(self.frames),
+            init_func=self._init_frame, interval=interval, repeat=repeat,
+            blit=True)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def layout(self, frame):
+        """
+        Returns the (interpolated) CascadeLayout of frame
+        """
+        idx, fraction = self.frames[frame]
+        if fraction == 0:
+            return self.layouts[idx]
+        if idx not in self._transitions:
+            # Only the transition being played is kept
+            self._transitions = {idx: LayoutTransition(self.layouts[idx],
+                                                       self.layouts[idx + 1])}
+        return self._transitions[idx].at(fraction)
+
+    def _init_frame(self):
+        return self._draw_frame(0)
+
+    def _draw_frame(self, frame):
+        self.handle.set_layout(self.layout(frame))
+        return self.handle.artist_list()
+
+    def save(self, path, fps=None, dpi=None, **savefig_kwargs):
+        """
+        Save the animation: a .gif (GifStreamWriter), a png sequence (path
+        ending in .png, see PngSequenceWriter) or any other file matplotlib
+        has a movie writer for. fps default from the interval.
+        """
+        if fps is None:
+            fps = 1000. / self.interval
+        extension = os.path.splitext(path)[1].lower()
+        if extension == ".gif":
+            writer = GifStreamWriter(fps)
+        elif extension == ".png":
+            writer = PngSequenceWriter(fps)
+        else:
+            self.animation.save(path, fps=fps, dpi=dpi,
+                                savefig_kwargs=savefig_kwargs)
+            return
+        self.animation.save(path, writer=writer, dpi=dpi,
+                            savefig_kwargs=savefig_kwargs)
+
+
+class GifStreamWriter(AbstractMovieWriter):
+    """
+    Movie writer appending each frame to an animated gif with Pillow as soon
+    as it is grabbed (matplotlib's PillowWriter keeps all the frames in
+    memory until the end). Each frame has its own palette.
+
+    loop: number of repetitions, 0 is forever
+    """
+
+    def __init__(self, fps=5, loop=0, metadata=None):
+        super().__init__(fps, metadata)
+        self.loop = loop
+
+    def setup(self, fig, outfile, dpi=None):
+        super().setup(fig, outfile, dpi=dpi)
+        self._file = open(outfile, "wb")
+        self.n_frames = 0
+
+    def grab_frame(self, **savefig_kwargs):
+        buffer = io.BytesIO()
+        self.fig.savefig(buffer, **dict(savefig_kwargs, format="rgba",
+                                        dpi=self.dpi))
+        image = Image.frombuffer("RGBA", self.frame_size, buffer.getbuffer(),
+                                 "raw", "RGBA", 0, 1)
+        frame = image.convert("RGB").quantize(
+            method=Image.Quantize.FASTOCTREE)
+        if self.n_frames == 0:
+            header, _ = GifImagePlugin.getheader(frame,
+                                                 info={"loop": self.loop})
+            self._file.write(b"".join(header))
+        self._file.write(b"".join(GifImagePlugin.getdata(
+            frame, duration=int(1000 / self.fps), include_color_table=True)))
+        self.n_frames += 1
+
+    def finish(self):
+        self._file.write(b";")   # gif trailer
+        self._file.close()
+
+
+class PngSequenceWriter(AbstractMovieWriter):
+    """
+    Movie writer saving each frame to its own png file when it is grabbed.
+    outfile is a pattern with the frame number, e.g. "frames/frame_%04d.png",
+    without % the number is added before the extension (frame_0000.png).
+    """
+
+    def setup(self, fig, outfile, dpi=None):
+        if "%" not in outfile:
+            root, extension = os.path.splitext(outfile)
+            outfile = root + "_%04d" + (extension or ".png")
+        super().setup(fig, outfile, dpi=dpi)
+        self.n_frames = 0
+
+    def grab_frame(self, **savefig_kwargs):
+        self.fig.savefig(self.outfile % self.n_frames,
+                         **dict(savefig_kwargs, format="png", dpi=self.dpi))
+        self.n_frames += 1
+
+    def finish(self):
+        pass
+
+
+def save_animation(path, snapshots, emphasis=None, bar_labels=None,
+                   representation=None, fps=20, dpi=100, figsize=(6.4, 4.8),
+                   title=None, stack_labels=None, makeup=True, **options):
+    """
+    Render the animation to path without pyplot (on its own Figure with an
+    Agg canvas, see render_to_bytes), options: the other arguments of
+    CascadeAnimation. Returns the number of frames.
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    figure = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(figure)
+    ax = figure.add_subplot()
+    animation = CascadeAnimation(ax, snapshots, emphasis, bar_labels,
+                                 representation, **options)
+    if makeup:
+        cebc.chart_makeup(ax, title, stack_labels)
+    animation.save(path, fps=fps, dpi=dpi)
+    return len(animation)
@@ -0,0 +1,154 @@
+"""
+Render many cascaded exploding bar-charts to image files in parallel
+
+Each chart is described by a spec (a dict):
+
+    data, emphasis, bar_labels: as for cascaded_exploding_barcharts()
+    output:         path of the image file to write
+    representation: None (default), "normalized" or "percentage"
+    style:          dict with typesetting entries, replaces the entries of
+                    exp_barch_tp_set for this chart only (see CascadeStyle)
+    format:         image format, default from the output extension
+    figsize:        (width, height) in inches, default (6.4, 4.8)
+    dpi:            default 100
+    batch:          see cascaded_exploding_barcharts(), default "cascade"
+    title, stack_labels: makeup of the chart, see chart_makeup()
+
+The charts are rendered by a pool of worker processes on Agg canvases
+without pyplot (the backend is left alone), each worker reuses a single
+Figure and canvas for all its charts.
+
+Usage from the command line:
+
+    python cascade_batch.py specs.json -j 8 --results results.json
+
+specs.json contains a list of specs, or one spec per line (json lines).
+The exit code is 1 when one of the charts failed.
+"""
+import argparse
+import json
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+
+# The Figure of the worker, reused between charts
+_worker_figure = None
+
+
+def _init_worker():
+    """
+    Initialize a worker: a single Figure with an Agg canvas
+    """
+    global _worker_figure
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    _worker_figure = Figure()
+    FigureCanvasAgg(_worker_figure)
+
+
+def render_spec(spec):
+    """
+    Render a single chart spec in the current process, returns the result
+    dict: index, output, ok, error, seconds, render_seconds, save_seconds
+    (None for the steps that were not completed)
+    """
+    if _worker_figure is None:
+        _init_worker()
+    import cascadedexplodingbarcharts as cebc
+
+    result = {"index": spec.get("index"), "output": spec.get("output"),
+              "ok": False, "error": None, "render_seconds": None,
+              "save_seconds": None}
+    start = time.perf_counter()
+    try:
+        # The style of the spec on top of the default typesetting
+        style = cebc.CascadeStyle(spec.get("style"))
+
+        figure = _worker_figure
+        figure.clear()
+        figure.set_size_inches(spec.get("figsize", (6.4, 4.8)))
+        figure.set_dpi(spec.get("dpi", 100))
+        ax = figure.add_subplot()
+
+        cebc.cascaded_exploding_barcharts(
+            ax, spec["data"], spec["emphasis"],
+            spec.get("bar_labels") or [None] * len(spec["data"]),
+            spec.get("representation"), spec.get("batch", "cascade"),
+            style=style)
+        cebc.chart_makeup(ax, spec.get("title"), spec.get("stack_labels"))
+        rendered = time.perf_counter()
+        result["render_seconds"] = rendered - start
+
+        figure.savefig(spec["output"], format=spec.get("format"),
+                       dpi=spec.get("dpi", 100))
+        result["save_seconds"] = time.perf_counter() - rendered
+        result["ok"] = True
+    except Exception:
+        result["error"] = traceback.format_exc()
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def render_batch(specs, processes=None, chunksize=1):
+    """
+    Render all chart specs with a pool of processes worker processes (default:
+    the number of cpus). processes=0 renders in the current process.
+    Returns the result dicts (see render_spec) in the order of the specs.
+    A failing chart does not stop the other charts.
+    """
+    specs = [dict(spec, index=idx) for idx, spec in enumerate(specs)]
+    if processes == 0:
+        return [render_spec(spec) for spec in specs]
+
+    with ProcessPoolExecutor(max_workers=processes,
+                             initializer=_init_worker) as pool:
+        return list(pool.map(render_spec, specs, chunksize=chunksize))
+
+
+def load_specs(path):
+    """
+    Load the specs from a json file with a list, or from json lines
+    """
+    with open(path) as spec_file:
+        text = spec_file.read()
+    if text.lstrip().startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Render cascaded exploding bar-charts from chart specs")
+    parser.add_argument("specs", help="json (lines) file with chart specs")
+    parser.add_argument("-j", "--processes", type=int, default=None,
+                        help="number of worker processes (default: cpus, "
+                             "0: no pool)")
+    parser.add_argument("--chunksize", type=int, default=1,
+                        help="number of specs send to a worker at once")
+    parser.add_argument("--results", default=None,
+                        help="write the results as json to this file")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    results = render_batch(load_specs(args.specs), args.processes,
+                           args.chunksize)
+    seconds = time.perf_counter() - start
+
+    if args.results:
+        with open(args.results, "w") as results_file:
+            json.dump(results, results_file, indent=2)
+
+    failed = [result for result in results if not result["ok"]]
+    for result in failed:
+        sys.stderr.write("Failed chart %d (%s):\n%s\n" % (
+            result["index"], result["output"], result["error"]))
+    print("Rendered %d of %d charts in %.2f s" % (
+        len(results) - len(failed), len(results), seconds))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
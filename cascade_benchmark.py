@@ -0,0 +1,365 @@
+"""
+Benchmark of cascaded_exploding_barcharts on synthetic cascades
+
+Runs a grid of stack count, boxes per stack, emphasis ranges per stack and
+representation. For each case the phases are timed separately:
+
+    normalize:   columnar data and normalization / percentage
+    label_fit:   measuring the box labels and the box_size_text_cutoff check
+                 (with an empty text metrics cache)
+    layout:      the complete cascade_layout, including normalize and
+                 label_fit (again with an empty text metrics cache)
+    bars:        drawing the boxes, box labels, bar labels and relative bars
+    explosions:  drawing the explosion lines, labels and backgrounds
+    save_<fmt>:  savefig to png (Agg), svg and pdf, with the file size
+    save_<fmt>_mixed: with --rasterize, savefig to svg and pdf again with the
+                 bulk geometry rasterized (see rasterize of
+                 cascaded_exploding_barcharts), to compare size and time
+
+The total is layout, bars, explosions and the saves (not the phases timed
+again as part of layout, nor the mixed saves). The artist counts and the
+peak (python) memory of a complete chart are recorded. The cold start
+(importing the module and rendering a first small chart with
+render_to_bytes in a new python process) is measured once. The results are
+written as json, compare two result files to find regressions:
+
+    python cascade_benchmark.py -o new.json
+    python cascade_benchmark.py --stacks 2 --segments 10 100 --quick
+    python cascade_benchmark.py --segments 1000 --formats svg pdf --rasterize
+    python cascade_benchmark.py --compare old.json new.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy
+import matplotlib
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+import cascadedexplodingbarcharts as cebc
+
+
+# Repeated palette, like real runtime breakdowns
+palette = ["#3F8080", "#346080", "#30A280", "#CFA080", "#C08080", "#CB8060",
+           "#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b"]
+
+
+def synthetic_cascade(n_stacks, n_segments, n_emphasis, seed=0):
+    """
+    Returns data, emphasis and bar_labels of a synthetic cascade: n_stacks
+    stacks of n_segments boxes with n_emphasis evenly spread emphasis ranges
+    per stack (except the last), each exploding to the same range in the next
+    stack
+    """
+    rng = numpy.random.default_rng(seed)
+    data = []
+    for stack_idx in range(n_stacks):
+        values = rng.pareto(2.0, n_segments) + 0.01
+        data.append([[float(value), "seg_%d" % idx,
+                      palette[idx % len(palette)]]
+                     for idx, value in enumerate(values)])
+
+    emphasis = []
+    for stack_idx in range(n_stacks):
+        subsets = []
+        if stack_idx < n_stacks - 1 and n_emphasis:
+            step = max(n_segments // n_emphasis, 1)
+            for begin in range(0, n_segments, step)[:n_emphasis]:
+                end = min(begin + max(step // 2, 1), n_segments) - 1
+                subsets.append([[begin, end, "E%d" % begin],
+                                [begin, end, "T%d" % begin]])
+        emphasis.append(subsets or [None])
+
+    bar_labels = ["stack %d" % idx for idx in range(n_stacks)]
+    return data, emphasis, bar_labels
+
+
+def _new_axes(figsize=(6.4, 4.8), dpi=100):
+    figure = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(figure)
+    return figure, figure.add_subplot()
+
+
+def _timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def _count_artists(ax):
+    counts = {"patches": len(ax.patches), "lines": len(ax.lines),
+              "texts": len(ax.texts), "collections": len(ax.collections)}
+    counts["total"] = sum(counts.values())
+    return counts
+
+
+def run_case(n_stacks, n_segments, n_emphasis, representation, batch=None,
+             formats=("png", "svg", "pdf"), memory=True, lod=None,
+             rasterize=False):
+    """
+    Benchmark a single case, returns the result dict
+    rasterize: also save the vector formats in mixed raster/vector mode
+    """
+    data, emphasis, bar_labels = synthetic_cascade(n_stacks, n_segments,
+                                                   n_emphasis)
+    figure, ax = _new_axes()
+    dpi = figure.dpi
+    phases = {}
+
+    style = cebc.CascadeStyle()
+    cebc.text_metrics.clear()
+    (cascade, bar_sums), phases["normalize"] = _timed(
+        lambda: cebc.CascadeData.from_data(data).normalize(representation))
+
+    def label_fit():
+        heights = cebc.text_metrics.heights(
+            cascade.labels, style["box_label_text"], dpi)
+        return (heights * style["box_size_text_cutoff"]) <= \
+               cascade.values
+    _, phases["label_fit"] = _timed(label_fit)
+
+    # label_fit filled the cache, layout measures the labels again
+    cebc.text_metrics.clear()
+    layout, phases["layout"] = _timed(
+        cebc._axes_cascade_layout, ax, data, emphasis, bar_labels,
+        representation, lod)
+
+    # Draw the stacks and the wedges separately to time them
+    components = layout.components()
+    stacks = cebc.CascadeLayout(layout.n_stacks, representation, dpi, **dict(
+        (name, components[name]) for name in
+        ("boxes", "box_labels", "bar_labels", "relative_bars")))
+    wedges = cebc.CascadeLayout(layout.n_stacks, representation, dpi, **dict(
+        (name, components[name]) for name in
+        ("explode_lines", "explode_labels", "explode_bgs")))
+    handles, phases["bars"] = _timed(cebc.render_cascade_layout, ax, stacks,
+                                     batch)
+    handles = [handles]
+    handle, phases["explosions"] = _timed(cebc.render_cascade_layout, ax,
+                                          wedges, batch)
+    handles.append(handle)
+
+    saves = {}
+    for fmt in formats:
+        buffer = io.BytesIO()
+        _, seconds = _timed(figure.savefig, buffer, format=fmt)
+        phases["save_" + fmt] = seconds
+        saves[fmt] = {"seconds": seconds, "bytes": len(buffer.getvalue())}
+
+    vector_formats = [fmt for fmt in formats if fmt in ("svg", "pdf", "eps")]
+    if rasterize and vector_formats:
+        for handle in handles:
+            handle.set_rasterize(True)
+        for fmt in vector_formats:
+            buffer = io.BytesIO()
+            _, seconds = _timed(figure.savefig, buffer, format=fmt)
+            phases["save_%s_mixed" % fmt] = seconds
+            saves[fmt + "_mixed"] = {"seconds": seconds,
+                                     "bytes": len(buffer.getvalue())}
+
+    result = {
+        "n_stacks": n_stacks, "n_segments": n_segments,
+        "n_emphasis": n_emphasis, "representation": representation,
+        "batch": batch, "lod": lod, "rasterize": rasterize,
+        "n_boxes": len(layout.boxes["x"]),
+        "phases": phases, "total_seconds": sum(
+            seconds for name, seconds in phases.items()
+            if name not in ("normalize", "label_fit") and
+            not name.endswith("_mixed")),
+        "save": saves, "artists": _count_artists(ax)}
+
+    if memory:
+        # A complete chart in a separate run, tracemalloc slows things down
+        tracemalloc.start()
+        figure, ax = _new_axes()
+        cebc.cascaded_exploding_barcharts(ax, data, emphasis, bar_labels,
+                                          representation, batch, lod)
+        figure.canvas.draw()
+        result["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return result
+
+
+# Run in a new python process by cold_start, prints the timings as json
+_cold_start_code = """
+import json, sys, time
+start = time.perf_counter()
+import cascadedexplodingbarcharts as cebc
+imported = time.perf_counter()
+cebc.render_to_bytes([[[2, "a", "#3F8080"], [3, "b", "#346080"]],
+                      [[1, "a", "#3F8080"]]],
+                     [[[[0, 0, "E"], [0, 0, "T"]]], [None]], ["A", "B"])
+rendered = time.perf_counter()
+print(json.dumps({"import_seconds": imported - start,
+                  "first_render_seconds": rendered - imported,
+                  "pyplot_imported": "matplotlib.pyplot" in sys.modules}))
+"""
+
+
+def cold_start(repeat=3):
+    """
+    Time importing cascadedexplodingbarcharts and rendering a first chart in
+    new python processes, returns the fastest of repeat runs
+    """
+    directory = os.path.dirname(os.path.abspath(cebc.__file__))
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.check_output([sys.executable, "-c",
+                                          _cold_start_code], cwd=directory)
+        runs.append(json.loads(output.decode("utf-8").splitlines()[-1]))
+    return min(runs, key=lambda run: run["import_seconds"] +
+               run["first_render_seconds"])
+
+
+def run_grid(stacks, segments, emphasis, representations, batches=(None,),
+             formats=("png", "svg", "pdf"), memory=True, lod=None,
+             verbose=False, cold=True, rasterize=False):
+    """
+    Benchmark all the combinations, returns the results dict for json
+    cold: also measure the cold start, see cold_start
+    """
+    results = {"python": platform.python_version(),
+               "matplotlib": matplotlib.__version__,
+               "numpy": numpy.__version__,
+               "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    if cold:
+        results["cold_start"] = cold_start()
+        if verbose:
+            print("cold start: import %.3f s  first render %.3f s" % (
+                results["cold_start"]["import_seconds"],
+                results["cold_start"]["first_render_seconds"]))
+
+    cases = []
+    for n_stacks in stacks:
+        for n_segments in segments:
+            for n_emphasis in emphasis:
+                for representation in representations:
+                    for batch in batches:
+                        case = run_case(n_stacks, n_segments, n_emphasis,
+                                        representation, batch, formats,
+                                        memory, lod, rasterize)
+                        if verbose:
+                            print(_case_summary(case))
+                        cases.append(case)
+
+    results["cases"] = cases
+    return results
+
+
+def _case_key(case):
+    return (case["n_stacks"], case["n_segments"], case["n_emphasis"],
+            case["representation"], case["batch"], case.get("lod"),
+            case.get("rasterize", False))
+
+
+def _size(n_bytes):
+    for unit in ("B", "kB", "MB"):
+        if n_bytes < 1024 or unit == "MB":
+            return "%.0f %s" % (n_bytes, unit) if unit == "B" else \
+                   "%.1f %s" % (n_bytes, unit)
+        n_bytes /= 1024.
+
+
+def _case_summary(case):
+    saves = ["%s %s %.3f s" % (fmt, _size(save["bytes"]), save["seconds"])
+             for fmt, save in case.get("save", {}).items()]
+    return "stacks=%-4d segments=%-6d emphasis=%-3d %-10s batch=%-7s " \
+           "%8.3f s  %6d artists  [%s]" % (
+               case["n_stacks"], case["n_segments"], case["n_emphasis"],
+               case["representation"], case["batch"], case["total_seconds"],
+               case["artists"]["total"], ", ".join(saves))
+
+
+def compare(old, new):
+    """
+    Returns lines comparing the total and phase timings of two result dicts
+    (new / old ratios, > 1 is slower), cases are matched on their parameters
+    """
+    old_cases = dict((_case_key(case), case) for case in old["cases"])
+    lines = []
+    if "cold_start" in old and "cold_start" in new:
+        lines.append("cold start  import x%.2f  first render x%.2f" % tuple(
+            new["cold_start"][key] / old["cold_start"][key]
+            for key in ("import_seconds", "first_render_seconds")))
+    for case in new["cases"]:
+        old_case = old_cases.get(_case_key(case))
+        if old_case is None:
+            continue
+        ratios = ["%s %.2f" % (phase, seconds / old_case["phases"][phase])
+                  for phase, seconds in case["phases"].items()
+                  if old_case["phases"].get(phase)]
+        lines.append("%s  x%.2f  (%s)" % (
+            _case_summary(case),
+            case["total_seconds"] / old_case["total_seconds"],
+            ", ".join(ratios)))
+    return lines
+
+
+def _representation(name):
+    return None if name.lower() == "none" else name
+
+
+def _batch(name):
+    return None if name.lower() == "none" else name
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark cascaded exploding bar-charts")
+    parser.add_argument("--stacks", type=int, nargs="+", default=[2, 8])
+    parser.add_argument("--segments", type=int, nargs="+",
+                        default=[10, 100, 1000])
+    parser.add_argument("--emphasis", type=int, nargs="+", default=[0, 2])
+    parser.add_argument("--representations", type=_representation, nargs="+",
+                        default=[None, "normalized", "percentage"])
+    parser.add_argument("--batch", type=_batch, nargs="+", default=[None],
+                        help="box drawing: none, stack and/or cascade")
+    parser.add_argument("--formats", nargs="+", default=["png", "svg", "pdf"])
+    parser.add_argument("--lod", type=float, default=None,
+                        help="level of detail threshold in pixels")
+    parser.add_argument("--rasterize", action="store_true",
+                        help="also save svg/pdf with the bulk geometry "
+                             "rasterized")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="skip the peak memory measurement")
+    parser.add_argument("--no-cold-start", action="store_true",
+                        help="skip the cold start measurement")
+    parser.add_argument("--quick", action="store_true",
+                        help="only png and no memory and cold start "
+                             "measurement")
+    parser.add_argument("-o", "--output", default=None,
+                        help="write the results as json to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"),
+                        help="compare two result files and exit")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as old, open(args.compare[1]) as new:
+            print("\n".join(compare(json.load(old), json.load(new))))
+        return 0
+
+    formats = ["png"] if args.quick else args.formats
+    results = run_grid(args.stacks, args.segments, args.emphasis,
+                       args.representations, args.batch, formats,
+                       not (args.no_memory or args.quick), args.lod,
+                       verbose=True,
+                       cold=not (args.no_cold_start or args.quick),
+                       rasterize=args.rasterize)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
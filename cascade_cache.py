@@ -0,0 +1,356 @@
+"""
+Content-addressed cache of rendered cascaded exploding bar-charts
+
+A chart is identified by a hash of everything that changes the image: data,
+emphasis, bar_labels, representation, style, figure size, dpi, format and
+the other render options. The rendered bytes (and the computed layouts) are
+kept in memory and/or in a directory, the least recently used entries are
+evicted when there are more than max_entries entries or more than max_bytes
+bytes (the limits apply to the memory and the directory separately).
+
+Usage:
+
+    cache = RenderCache(max_bytes=64 * 2 ** 20, directory="chart-cache")
+    png = cache.render(data, emphasis, bar_labels, "percentage", dpi=100)
+    layout = cache.layout(data, emphasis, bar_labels, "percentage", dpi=100)
+    print(cache.stats())
+
+The directory can be shared between processes, the entries are written
+atomically and are never changed afterwards. A lookup also finds the entries
+written by other processes and the directory is scanned again before
+evicting (least recently used on the modification times of the files).
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy
+
+import cascadedexplodingbarcharts as cebc
+
+
+# Part of every key, change it when the rendering changes so old entries in
+# a cache directory are not used
+cache_version = 1
+
+# Options of render_to_bytes that do not change the image, not in the key
+unkeyed_options = ("instrument",)
+
+
+def _jsonable(value):
+    # json.dumps default for the numpy values in the data
+    if isinstance(value, numpy.ndarray):
+        return value.tolist()
+    if isinstance(value, numpy.generic):
+        return value.item()
+    if isinstance(value, cebc.CascadeData):
+        return {"values": hashlib.sha256(numpy.ascontiguousarray(
+                    value.values, dtype=float).tobytes()).hexdigest(),
+                "offsets": value.offsets, "labels": value.labels,
+                "colors": value.colors}
+    raise TypeError("can not hash %r" % (value,))
+
+
+def _resolved_emphasis(data, emphasis):
+    """
+    Helper function returning emphasis with the range bounds given as labels
+    or predicates replaced by their box indices (predicates can not be
+    hashed, the same chart gets the same key either way)
+    """
+    def is_named(bound):
+        return isinstance(bound, str) or callable(bound)
+
+    def resolve(emph_range, stack_idx, cascade):
+        if emph_range is None or not any(is_named(bound)
+                                         for bound in emph_range[:2]):
+            return emph_range
+        if stack_idx >= len(cascade):
+            return None   # target of the last stack, not drawn
+        index = cascade.label_index(stack_idx)
+        return [index.position(bound, last=bool(pos)) if is_named(bound)
+                else bound for pos, bound in enumerate(emph_range[:2])] + \
+               list(emph_range[2:])
+
+    if emphasis is None or not any(
+            is_named(bound) for stack in emphasis if stack
+            for subset in stack if subset
+            for emph_range in subset if emph_range
+            for bound in emph_range[:2]):
+        return emphasis
+    cascade = data if isinstance(data, cebc.CascadeData) \
+              else cebc.CascadeData.from_data(data)
+    return [stack if not stack else
+            [subset if not subset else
+             [resolve(subset[0], stack_idx, cascade),
+              resolve(subset[1], stack_idx + 1, cascade)] + list(subset[2:])
+             for subset in stack]
+            for stack_idx, stack in enumerate(emphasis)]
+
+
+def _digest(*parts):
+    text = json.dumps(parts, sort_keys=True, default=_jsonable,
+                      separators=(",", ":"))
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def render_key(data, emphasis, bar_labels, representation=None, format="png",
+               dpi=100, figsize=(6.4, 4.8), style=None, **options):
+    """
+    Returns the cache key of a chart rendered by render_to_bytes with these
+    arguments (options: the other arguments of render_to_bytes, those in
+    unkeyed_options are left out)
+    """
+    style = cebc.cascade_style(style).to_dict()
+    options = dict((name, option) for name, option in options.items()
+                   if name not in unkeyed_options)
+    emphasis = _resolved_emphasis(data, emphasis)
+    return "%s.%s" % (_digest(cache_version, "render", data, emphasis,
+                              bar_labels, representation, format, dpi,
+                              list(figsize), style, options), format)
+
+
+def layout_key(data, emphasis, bar_labels, representation=None, dpi=None,
+               lod_threshold=None, style=None):
+    """
+    Returns the cache key of the CascadeLayout computed by cascade_layout
+    with these arguments
+    """
+    style = cebc.cascade_style(style).to_dict()
+    emphasis = _resolved_emphasis(data, emphasis)
+    return "%s.layout.json" % _digest(cache_version, "layout", data, emphasis,
+                                      bar_labels, representation, dpi,
+                                      lod_threshold, style)
+
+
+class _Store(object):
+    """
+    LRU bookkeeping of the sizes of the entries in memory or in a directory
+    """
+
+    def __init__(self, max_bytes, max_entries):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.sizes = OrderedDict()   # key -> bytes, least recently used first
+        self.bytes = 0
+
+    def touch(self, key):
+        self.sizes.move_to_end(key)
+
+    def add(self, key, size):
+        """
+        Add an entry, returns the keys of the evicted entries
+        """
+        if key in self.sizes:
+            self.bytes -= self.sizes.pop(key)
+        self.sizes[key] = size
+        self.bytes += size
+        evicted = []
+        while self.sizes and (len(self.sizes) > self.max_entries or
+                              self.bytes > self.max_bytes):
+            old, old_size = self.sizes.popitem(last=False)
+            self.bytes -= old_size
+            evicted.append(old)
+        return evicted
+
+    def remove(self, key):
+        if key in self.sizes:
+            self.bytes -= self.sizes.pop(key)
+
+
+class RenderCache(object):
+    """
+    Cache of rendered charts and layouts in memory and/or a directory
+
+    max_bytes:   the maximal total size of the entries (memory and directory
+                 each), default 64 MB
+    max_entries: the maximal number of entries (memory and directory each)
+    memory:      keep the entries in memory
+    directory:   None or the directory to keep the entries in, created when
+                 missing. Existing entries in it are used.
+
+    A single cache can be used from multiple threads.
+    """
+
+    def __init__(self, max_bytes=64 * 2 ** 20, max_entries=1024, memory=True,
+                 directory=None):
+        self.memory = _Store(max_bytes, max_entries) if memory else None
+        self.directory = directory
+        self.disk = None
+        self._entries = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.evictions = 0
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self.disk = _Store(max_bytes, max_entries)
+            self._scan()
+
+    def _scan(self):
+        # The entries in the directory (also those of other processes), least
+        # recently used first, evicting the entries over the limits
+        entries = []
+        for name in os.listdir(self.directory):
+            path = self._path(name)
+            if name.startswith("."):
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue   # evicted by another process
+            if os.path.isfile(path):
+                entries.append((stat.st_mtime, name, stat.st_size))
+        self.disk = _Store(self.disk.max_bytes, self.disk.max_entries)
+        for _, name, size in sorted(entries):
+            self._evict_files(self.disk.add(name, size))
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def _evict_files(self, keys):
+        for key in keys:
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def _read(self, key):
+        try:
+            with open(self._path(key), "rb") as entry_file:
+                value = entry_file.read()
+            os.utime(self._path(key))
+        except OSError:
+            self.disk.remove(key)
+            return None
+        # Also entries written by another process since the last scan
+        self._evict_files(self.disk.add(key, len(value)))
+        return value
+
+    def _write(self, key, value):
+        handle, temporary = tempfile.mkstemp(dir=self.directory,
+                                             prefix=".tmp-")
+        with os.fdopen(handle, "wb") as entry_file:
+            entry_file.write(value)
+        os.replace(temporary, self._path(key))
+        # Other processes may have added entries as well
+        self._scan()
+
+    def get(self, key):
+        """
+        Returns the cached bytes of key or None, counted as hit or miss
+        """
+        with self._lock:
+            if self.memory is not None and key in self._entries:
+                self.memory.touch(key)
+                self.hits += 1
+                self.memory_hits += 1
+                return self._entries[key]
+            if self.disk is not None:
+                value = self._read(key)
+                if value is not None:
+                    self.hits += 1
+                    self.disk_hits += 1
+                    self._remember(key, value)
+                    return value
+            self.misses += 1
+            return None
+
+    def _remember(self, key, value):
+        if self.memory is None:
+            return
+        self._entries[key] = value
+        for old in self.memory.add(key, len(value)):
+            self.evictions += 1
+            del self._entries[old]
+
+    def put(self, key, value):
+        """
+        Store the bytes value for key
+        """
+        with self._lock:
+            self._remember(key, value)
+            if self.disk is not None:
+                self._write(key, value)
+
+    def clear(self):
+        """
+        Remove all the entries (also in the directory) and reset the counters
+        """
+        with self._lock:
+            if self.memory is not None:
+                self._entries.clear()
+                self.memory = _Store(self.memory.max_bytes,
+                                     self.memory.max_entries)
+            if self.disk is not None:
+                self._scan()
+                for key in list(self.disk.sizes):
+                    try:
+                        os.remove(self._path(key))
+                    except OSError:
+                        pass
+                self.disk = _Store(self.disk.max_bytes, self.disk.max_entries)
+            self.hits = self.misses = self.evictions = 0
+            self.memory_hits = self.disk_hits = 0
+
+    def stats(self):
+        """
+        Returns a dict with the hits, misses, hit_rate, evictions (from memory
+        and from the directory) and the entries and bytes in memory and in the
+        directory
+        """
+        with self._lock:
+            requests = self.hits + self.misses
+            stats = {"hits": self.hits, "misses": self.misses,
+                     "hit_rate": self.hits / requests if requests else 0.,
+                     "memory_hits": self.memory_hits,
+                     "disk_hits": self.disk_hits,
+                     "evictions": self.evictions}
+            for name, store in (("memory", self.memory), ("disk", self.disk)):
+                if store is not None:
+                    stats[name + "_entries"] = len(store.sizes)
+                    stats[name + "_bytes"] = store.bytes
+            return stats
+
+    def render(self, data, emphasis, bar_labels, representation=None,
+               format="png", dpi=100, figsize=(6.4, 4.8), style=None,
+               **options):
+        """
+        Returns the image bytes of the chart, rendered with render_to_bytes
+        (see there for the arguments) when it is not in the cache (an
+        instrument only receives the spans of a rendered chart)
+        """
+        style = cebc.cascade_style(style)
+        key = render_key(data, emphasis, bar_labels, representation, format,
+                         dpi, figsize, style, **options)
+        value = self.get(key)
+        if value is None:
+            value = cebc.render_to_bytes(
+                data, emphasis, bar_labels, representation, format=format,
+                dpi=dpi, figsize=figsize, style=style, **options)
+            self.put(key, value)
+        return value
+
+    def layout(self, data, emphasis, bar_labels, representation=None,
+               dpi=None, lod_threshold=None, style=None):
+        """
+        Returns the CascadeLayout of the chart (see cascade_layout), computed
+        when it is not in the cache. Draw it with render_cascade_layout.
+        """
+        style = cebc.cascade_style(style)
+        key = layout_key(data, emphasis, bar_labels, representation, dpi,
+                         lod_threshold, style)
+        value = self.get(key)
+        if value is not None:
+            return cebc.CascadeLayout.from_json(value.decode("utf-8"))
+        layout = cebc.cascade_layout(data, emphasis, bar_labels,
+                                     representation, dpi, lod_threshold,
+                                     style=style)
+        self.put(key, layout.to_json().encode("utf-8"))
+        return layout
@@ -0,0 +1,147 @@
+"""
+Small multiples: many cascaded exploding bar-charts in a grid on one figure
+
+Puts a cascade per panel (e.g. one per node or per configuration) in a grid
+of subplots. All panels use a single CascadeStyle and the shared label
+measurement and color caches (text_metrics, color_cache) of
+cascadedexplodingbarcharts: the measurement renderer is set up and each
+distinct label and color is measured or converted only once for the whole
+figure. With sharey all panels get the same y scale. Nothing is drawn until
+the figure is, all panels are drawn in that single pass of the canvas.
+
+Usage:
+
+    panels = OrderedDict([("node 1", (data_1, emphasis_1, bar_labels_1)),
+                          ("node 2", (data_2, emphasis_2, bar_labels_2))])
+    handles = cascade_grid(figure, panels, "percentage", ncols=4)
+    figure.savefig("nodes.png")
+
+Or without pyplot:
+
+    png = render_grid_to_bytes(panels, sharey=True, panel_size=(3.2, 2.4))
+"""
+import io
+import math
+from collections import OrderedDict
+
+import cascadedexplodingbarcharts as cebc
+
+
+def _panel_spec(panel):
+    """
+    Helper function returning the (data, emphasis, bar_labels,
+    stack_labels) of a panel: a (data, emphasis, bar_labels) tuple or a dict
+    with those entries and optionally stack_labels
+    """
+    if isinstance(panel, dict):
+        data = panel["data"]
+        spec = (data, panel.get("emphasis"), panel.get("bar_labels"),
+                panel.get("stack_labels"))
+    else:
+        data, emphasis, bar_labels = panel
+        spec = (data, emphasis, bar_labels, None)
+    if spec[2] is None:
+        spec = spec[:2] + ([None] * len(data),) + spec[3:]
+    return spec
+
+
+def grid_shape(n_panels, ncols=None):
+    """
+    Returns the (rows, columns) of a grid for n_panels, default about square
+    """
+    if ncols is None:
+        ncols = int(math.ceil(math.sqrt(n_panels)))
+    ncols = max(1, min(ncols, n_panels))
+    return int(math.ceil(n_panels / float(ncols))), ncols
+
+
+def cascade_grid(figure, panels, representation=None, ncols=None,
+                 sharey=False, batch="cascade", lod=None, instrument=None,
+                 style=None, rasterize=False, titles=True, makeup=True):
+    """
+    Draw a grid of cascades on figure
+
+    panels: mapping of panel key to (data, emphasis, bar_labels) or to a
+            dict with data, emphasis, bar_labels and stack_labels, in the
+            order of the grid (row by row)
+    representation, batch, lod, instrument, style, rasterize: see
+            cascaded_exploding_barcharts, the same for all panels (style is
+            converted to a single CascadeStyle)
+    ncols:  the number of columns of the grid, default about square
+    sharey: all panels get the y limits fitting all the charts
+    titles: the panel key as title of each panel
+    makeup: apply chart_makeup (with the stack_labels of the panel)
+
+    Returns an OrderedDict of panel key to the CascadeArtists of the panel,
+    the Axes is handle.ax
+    """
+    style = cebc.cascade_style(style)
+    if not panels:
+        return OrderedDict()
+    nrows, ncols = grid_shape(len(panels), ncols)
+    axes = figure.subplots(nrows, ncols, squeeze=False).ravel()
+    # Panels left empty in the last row
+    for ax in axes[len(panels):]:
+        ax.remove()
+
+    handles = OrderedDict()
+    stack_labels = {}
+    for ax, (key, panel) in zip(axes, panels.items()):
+        data, emphasis, bar_labels, stack_labels[key] = _panel_spec(panel)
+        layout = cebc._axes_cascade_layout(ax, data, emphasis, bar_labels,
+                                           representation, lod, instrument,
+                                           style)
+        handles[key] = cebc.render_cascade_layout(
+            ax, layout, batch, emphasis, bar_labels, lod, instrument, style,
+            rasterize)
+
+    if sharey:
+        bounds = dict((key, handle.layout.bounds())
+                      for key, handle in handles.items())
+        bounds = dict((key, bound) for key, bound in bounds.items()
+                      if bound is not None)
+        if bounds:
+            ymin = min(bound[0][1] for bound in bounds.values())
+            ymax = max(bound[1][1] for bound in bounds.values())
+            # Extend the data limits of each panel in y only, the autoscaling
+            # then gives all panels the same y limits
+            for key, ((x, _), _) in bounds.items():
+                handles[key].ax.update_datalim([(x, ymin), (x, ymax)])
+                handles[key].ax.autoscale_view()
+
+    for key, handle in handles.items():
+        if makeup:
+            cebc.chart_makeup(handle.ax, None, stack_labels[key])
+        if titles:
+            handle.ax.set_title(str(key))
+    return handles
+
+
+def render_grid_to_bytes(panels, representation=None, ncols=None,
+                         sharey=False, format="png", dpi=100,
+                         panel_size=(3.2, 2.4), **options):
+    """
+    Render a grid of cascades to an image in memory without pyplot (on its
+    own Figure with an Agg canvas, see render_to_bytes)
+
+    panel_size: (width, height) in inches of each panel
+    options: the other arguments of cascade_grid
+
+    Returns the bytes of the image
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    nrows, ncols = grid_shape(len(panels), ncols)
+    width, height = panel_size[0] * ncols, panel_size[1] * nrows
+    figure = Figure(figsize=(width, height), dpi=dpi)
+    FigureCanvasAgg(figure)
+    # Fixed margins (in inches) for the titles and tick labels, a layout
+    # engine would need an extra pass over all the panels
+    figure.subplots_adjust(left=.15 / width, right=1 - .15 / width,
+                           bottom=.35 / height, top=1 - .35 / height,
+                           wspace=.1, hspace=.35)
+    cascade_grid(figure, panels, representation, ncols, sharey, **options)
+    output = io.BytesIO()
+    figure.savefig(output, format=format, dpi=dpi)
+    return output.getvalue()
@@ -0,0 +1,265 @@
+"""
+Interactive inspection of a drawn cascade: hover tooltips and picking
+
+The box or wedge under the mouse is found from the CascadeLayout instead of
+asking every artist (matplotlib's contains), a SegmentIndex maps the cursor x
+to a stack and bisects the bottoms of the boxes of that stack: O(log n) per
+mouse move, independent of the number of artists (also for batched charts,
+which have no artist per box). Explosion wedges are hit-tested on the
+interpolated explosion lines of the wedges starting at that stack.
+
+A single annotation shows the label, value and percentage of the stack of
+the box (or the labels and share of the wedge) and is redrawn with blitting.
+
+Usage:
+
+    handle = cascaded_exploding_barcharts(ax, data, emphasis, bar_labels)
+    inspector = CascadeInspector(handle, on_click=print)
+    plt.show()
+
+Keep a reference to the inspector while the figure is shown. The index
+follows handle.update() (and CascadeViewport, CascadeAnimation handles).
+"""
+import numpy
+
+
+class CascadeHit(object):
+    """
+    A box or wedge under the cursor
+
+    kind:       "box" or "wedge"
+    index:      the index of the box or wedge in the layout
+    stack:      the stack of the box, or the stack the wedge starts from
+    label:      the box label, or the labels of the wedge (None without)
+    value:      the height of the box or of the emphasized range of the wedge
+                in the units of the representation (the data value without
+                representation)
+    percentage: value as percentage of the stack
+    """
+
+    def __init__(self, kind, index, stack, label, value, percentage):
+        self.kind = kind
+        self.index = index
+        self.stack = stack
+        self.label = label
+        self.value = value
+        self.percentage = percentage
+
+    def __eq__(self, other):
+        return isinstance(other, CascadeHit) and \
+               (self.kind, self.index) == (other.kind, other.index)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return "CascadeHit(%r, %d, stack=%d, label=%r, value=%g, " \
+               "percentage=%.1f)" % (self.kind, self.index, self.stack,
+                                     self.label, self.value, self.percentage)
+
+    def text(self):
+        """
+        The tooltip text
+        """
+        if self.kind == "box":
+            return "%s\n%g (%.1f%%)" % (self.label, self.value,
+                                        self.percentage)
+        return "%s%.1f%% of the stack" % (
+            self.label + "\n" if self.label else "", self.percentage)
+
+
+class SegmentIndex(object):
+    """
+    Interval index of the boxes and wedges of a CascadeLayout, hit(x, y) in
+    data coordinates returns the CascadeHit or None. Built once per layout.
+    """
+
+    def __init__(self, layout):
+        self.layout = layout
+        boxes = layout.boxes
+        stacks = numpy.arange(layout.n_stacks)
+        self.starts = numpy.searchsorted(boxes["stack"], stacks)
+        self.ends = numpy.searchsorted(boxes["stack"], stacks, side="right")
+        # The x extent of the stacks with boxes, ordered on x
+        filled = self.ends > self.starts
+        self.stacks = stacks[filled]
+        lefts = boxes["x"]
+        rights = boxes["x"] + boxes["width"]
+        self.lefts = numpy.minimum.reduceat(lefts, self.starts[filled]) \
+                     if len(lefts) else numpy.zeros(0)
+        self.rights = numpy.maximum.reduceat(rights, self.starts[filled]) \
+                      if len(rights) else numpy.zeros(0)
+        self.totals = numpy.zeros(layout.n_stacks)
+        numpy.add.at(self.totals, boxes["stack"], boxes["height"])
+
+        lines = layout.explode_lines
+        self.wedge_lefts = lines["xs"][:, 0]
+
+    def box_at(self, x, y):
+        """
+        Returns the index of the box at (x, y) or None
+        """
+        idx = numpy.searchsorted(self.lefts, x, side="right") - 1
+        if idx < 0 or x > self.rights[idx]:
+            return None
+        stack = self.stacks[idx]
+        begin, end = self.starts[stack], self.ends[stack]
+        boxes = self.layout.boxes
+        box = begin + numpy.searchsorted(boxes["bottom"][begin:end], y,
+                                         side="right") - 1
+        if box < begin or y > boxes["bottom"][box] + boxes["height"][box] or \
+           not boxes["x"][box] <= x <= boxes["x"][box] + boxes["width"][box]:
+            return None
+        return int(box)
+
+    def wedge_at(self, x, y):
+        """
+        Returns the index of the (narrowest) wedge at (x, y) or None
+        """
+        lines = self.layout.explode_lines
+        last = numpy.searchsorted(self.wedge_lefts, x, side="right") - 1
+        if last < 0:
+            return None
+        hit = None
+        height = numpy.inf
+        # The wedges of a stack all start at the same x
+        for wedge in self.layout.indices("explode_lines",
+                                         lines["stack"][last]):
+            x0, x1 = lines["xs"][wedge]
+            if not x0 <= x <= x1 or x1 <= x0:
+                continue
+            fraction = (x - x0) / (x1 - x0)
+            ys_bottom = lines["ys_bottom"][wedge]
+            ys_top = lines["ys_top"][wedge]
+            bottom = ys_bottom[0] + (ys_bottom[1] - ys_bottom[0]) * fraction
+            top = ys_top[0] + (ys_top[1] - ys_top[0]) * fraction
+            if bottom <= y <= top and top - bottom < height:
+                hit = wedge
+                height = top - bottom
+        return hit
+
+    def hit(self, x, y):
+        """
+        Returns the CascadeHit of the box or wedge at (x, y) or None
+        """
+        layout = self.layout
+        box = self.box_at(x, y)
+        if box is not None:
+            boxes = layout.boxes
+            stack = boxes["stack"][box]
+            value = boxes["height"][box]
+            total = self.totals[stack]
+            return CascadeHit("box", box, int(stack),
+                              str(boxes["label"][box]), float(value),
+                              100. * value / total if total else 0.)
+        wedge = self.wedge_at(x, y)
+        if wedge is None:
+            return None
+        lines = layout.explode_lines
+        stack = lines["stack"][wedge]
+        value = lines["ys_top"][wedge][0] - lines["ys_bottom"][wedge][0]
+        total = self.totals[stack]
+        texts = layout.explode_labels["text"][
+            layout.indices("explode_labels", wedge)]
+        label = " > ".join(str(text) for text in texts) or None
+        return CascadeHit("wedge", int(wedge), int(stack), label, float(value),
+                          100. * value / total if total else 0.)
+
+
+class CascadeInspector(object):
+    """
+    Hover tooltips on a drawn cascade
+
+    handle: the handle returned by cascaded_exploding_barcharts (or
+            render_cascade_layout), its Axes and current layout are used
+    on_click: None or a function called with the CascadeHit (or None) when
+            the chart is clicked
+    annotation_kwargs: settings of the annotation (ax.annotate arguments)
+
+    hit: the current CascadeHit under the cursor
+    """
+
+    def __init__(self, handle, on_click=None, **annotation_kwargs):
+        self.handle = handle
+        self.ax = handle.ax
+        self.canvas = self.ax.figure.canvas
+        self.on_click = on_click
+        self.hit = None
+        self._index = None
+        self._background = None
+
+        settings = {"xytext": (12, 12), "textcoords": "offset points",
+                    "bbox": {"boxstyle": "round", "fc": "w", "alpha": .9},
+                    "fontsize": 9}
+        settings.update(annotation_kwargs)
+        self.annotation = self.ax.annotate("", (0, 0), **settings)
+        self.annotation.set_visible(False)
+        # Only drawn by blitting, not part of the background
+        self.annotation.set_animated(True)
+
+        self._callbacks = [
+            self.canvas.mpl_connect("draw_event", self._on_draw),
+            self.canvas.mpl_connect("motion_notify_event", self._on_move),
+            self.canvas.mpl_connect("button_press_event", self._on_press)]
+
+    def index(self):
+        """
+        Returns the SegmentIndex of the current layout of the handle
+        """
+        if self._index is None or self._index.layout is not \
+           self.handle.layout:
+            self._index = SegmentIndex(self.handle.layout)
+        return self._index
+
+    def hit_test(self, x, y):
+        """
+        Returns the CascadeHit at (x, y) in data coordinates or None
+        """
+        return self.index().hit(x, y)
+
+    def _event_hit(self, event):
+        if event.inaxes is not self.ax or event.xdata is None:
+            return None
+        return self.hit_test(event.xdata, event.ydata)
+
+    def _on_draw(self, event):
+        if self.canvas.supports_blit:
+            self._background = self.canvas.copy_from_bbox(
+                self.ax.figure.bbox)
+        if self.annotation.get_visible():
+            self.ax.draw_artist(self.annotation)
+
+    def _on_move(self, event):
+        hit = self._event_hit(event)
+        if hit is None and self.hit is None:
+            return
+        if hit is not None:
+            if hit != self.hit:
+                self.annotation.set_text(hit.text())
+            # The tooltip follows the cursor
+            self.annotation.xy = (event.xdata, event.ydata)
+        self.hit = hit
+        self.annotation.set_visible(hit is not None)
+        self._blit()
+
+    def _on_press(self, event):
+        if self.on_click is not None and event.inaxes is self.ax:
+            self.on_click(self._event_hit(event))
+
+    def _blit(self):
+        if self._background is None:
+            self.canvas.draw_idle()
+            return
+        self.canvas.restore_region(self._background)
+        if self.annotation.get_visible():
+            self.ax.draw_artist(self.annotation)
+        self.canvas.blit(self.ax.figure.bbox)
+
+    def disconnect(self):
+        """
+        Stop the inspection and remove the annotation
+        """
+        for callback in self._callbacks:
+            self.canvas.mpl_disconnect(callback)
+        self._callbacks = []
+        self.annotation.remove()
@@ -0,0 +1,298 @@
+"""
+Streaming ingestion of timing-breakdown logs into cascade data
+
+Reads records (stack, category, value[, color]) from json lines or csv files
+one line at a time and keeps a running sum per stack and category. Memory
+use depends on the number of stacks and categories, not on the size of the
+log. The result is the data and bar_labels for cascaded_exploding_barcharts:
+the stacks and the categories in a stack are in order of first appearance
+and each new category gets the next unused palette color (see
+CategoryColors), the same one in every stack.
+
+json lines: one object per line {"stack":..., "category":..., "value":...,
+            "color":...} (color optional) or a list [stack, category, value]
+csv:        the columns stack, category, value[, color], an optional header
+            line is skipped (tsv: the same, tab separated)
+
+Usage:
+
+    data, bar_labels = load_cascade("timings.jsonl")
+
+Or from the command line, printing a json object with data and bar_labels:
+
+    python cascade_loader.py timings.csv
+    python cascade_loader.py timings.tsv
+    python cascade_loader.py timings.jsonl --follow --interval 2
+    python cascade_loader.py timings.csv --colors colors.json
+
+With --colors the colors of the categories are read from (and the new ones
+written back to) a json file, the categories keep their color between runs.
+
+With --follow the file is watched and the aggregate is printed again (one
+json object per line) each time new lines are appended. In python use
+follow_cascade(), e.g. with handle.update(data) for a live chart.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+import zlib
+from collections import OrderedDict
+
+# Characters read at a time when following a log file
+FOLLOW_CHUNK_SIZE = 1 << 16
+
+
+# The matplotlib tab20 colors without the grays (the grays are the lod and
+# self boxes), assigned to the categories in order
+category_palette = [
+    "#1f77b4", "#aec7e8", "#ff7f0e", "#ffbb78", "#2ca02c", "#98df8a",
+    "#d62728", "#ff9896", "#9467bd", "#c5b0d5", "#8c564b", "#c49c94",
+    "#e377c2", "#f7b6d2", "#bcbd22", "#dbdb8d", "#17becf", "#9edae5"]
+
+
+def category_color(category, palette=None):
+    """
+    Color of a category from a hash of its name, the same in every process
+    and independent of the other categories (different categories can get
+    the same color, for the colors of a chart use CategoryColors)
+    """
+    palette = palette or category_palette
+    return palette[zlib.crc32(str(category).encode("utf-8")) % len(palette)]
+
+
+class CategoryColors(object):
+    """
+    Colors of categories: each new category gets the next palette color not
+    used yet (in order of first appearance), so categories only share a
+    color when there are more categories than palette colors
+
+    palette: the colors to assign, default category_palette
+    colors:  None or a dict category -> color of known categories (e.g.
+             loaded from a file), new categories are added to it
+    """
+
+    def __init__(self, palette=None, colors=None):
+        self.palette = list(palette or category_palette)
+        self.colors = {} if colors is None else colors
+        self._next = 0
+
+    def __call__(self, category):
+        if category not in self.colors:
+            used = set(self.colors.values())
+            free = [color for color in self.palette[self._next:]
+                    if color not in used]
+            if free:
+                color = free[0]
+                self._next = self.palette.index(color) + 1
+            else:
+                # All used, start again at the beginning of the palette
+                color = self.palette[len(self.colors) % len(self.palette)]
+            self.colors[category] = color
+        return self.colors[category]
+
+    def set(self, category, color):
+        """
+        Give the category an explicit color
+        """
+        self.colors[category] = color
+
+
+class CascadeAggregator(object):
+    """
+    Running sums per stack and category
+
+    palette, colors: the automatic colors of the categories, see
+             CategoryColors
+    """
+
+    def __init__(self, palette=None, colors=None):
+        self.sums = OrderedDict()   # stack -> OrderedDict(category -> sum)
+        self.category_colors = CategoryColors(palette, colors)
+        self.colors = self.category_colors.colors   # category -> color
+        self.n_records = 0
+
+    def add(self, stack, category, value, color=None):
+        stack_sums = self.sums.setdefault(stack, OrderedDict())
+        stack_sums[category] = stack_sums.get(category, 0.) + float(value)
+        # An explicit color in the log wins from the automatic one
+        if color:
+            self.category_colors.set(category, color)
+        else:
+            self.category_colors(category)
+        self.n_records += 1
+
+    def add_records(self, records):
+        for record in records:
+            self.add(*record)
+        return self
+
+    def to_data(self):
+        """
+        Returns the data and bar_labels for cascaded_exploding_barcharts
+        """
+        data = [[[value, category, self.colors[category]]
+                 for category, value in stack_sums.items()]
+                for stack_sums in self.sums.values()]
+        bar_labels = [str(stack) for stack in self.sums]
+        return data, bar_labels
+
+    def to_cascade_data(self):
+        """
+        Returns the columnar CascadeData and the bar_labels
+        """
+        from cascadedexplodingbarcharts import CascadeData
+        data, bar_labels = self.to_data()
+        return CascadeData.from_data(data), bar_labels
+
+
+def _format_of(path, format=None):
+    if format:
+        return format
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".csv", ".tsv"):
+        return extension[1:]
+    return "jsonl"
+
+
+def parse_line(line, format="jsonl", first=False):
+    """
+    Parse a single log line into a (stack, category, value[, color]) record,
+    returns None for empty lines and for a csv header (only on the first
+    line, any other line without a value raises ValueError)
+    """
+    line = line.strip()
+    if not line:
+        return None
+
+    if format in ("csv", "tsv"):
+        fields = next(csv.reader([line], delimiter="\t" if format == "tsv"
+                                 else ","))
+        try:
+            float(fields[2])
+        except (ValueError, IndexError):
+            if first:
+                return None   # header
+            raise ValueError("no stack, category and value in %s line %r"
+                             % (format, line))
+        return (fields[0], fields[1], float(fields[2])) + \
+               tuple(field for field in fields[3:4] if field)
+
+    record = json.loads(line)
+    if isinstance(record, dict):
+        return (record["stack"], record["category"], float(record["value"]),
+                record.get("color"))
+    return tuple(record)
+
+
+def read_records(path, format=None):
+    """
+    Generator of the records in the log file, one line at a time
+    """
+    format = _format_of(path, format)
+    first = True
+    with open(path) as log_file:
+        for line in log_file:
+            if not line.strip():
+                continue
+            record = parse_line(line, format, first)
+            first = False
+            if record is not None:
+                yield record
+
+
+def load_cascade(path, format=None, palette=None, colors=None):
+    """
+    Aggregate the log file, returns data and bar_labels (palette, colors: see
+    CategoryColors)
+    """
+    aggregator = CascadeAggregator(palette, colors)
+    aggregator.add_records(read_records(path, format))
+    return aggregator.to_data()
+
+
+def follow_cascade(path, format=None, interval=1.0, palette=None,
+                   colors=None):
+    """
+    Generator following a growing log file: yields (data, bar_labels) for the
+    current content and again each time complete lines are appended. Only the
+    new lines are read (FOLLOW_CHUNK_SIZE characters at a time), incomplete
+    last lines wait for the next poll.
+    """
+    format = _format_of(path, format)
+    aggregator = CascadeAggregator(palette, colors)
+    pending = ""
+    first = True
+    added = False
+    with open(path) as log_file:
+        while True:
+            chunk = log_file.read(FOLLOW_CHUNK_SIZE)
+            if chunk:
+                lines = (pending + chunk).split("\n")
+                pending = lines.pop()
+                for line in lines:
+                    if not line.strip():
+                        continue
+                    record = parse_line(line, format, first)
+                    first = False
+                    added = True
+                    if record is not None:
+                        aggregator.add(*record)
+            if len(chunk) < FOLLOW_CHUNK_SIZE:
+                # At the end of the file
+                if added:
+                    yield aggregator.to_data()
+                    added = False
+                else:
+                    time.sleep(interval)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Aggregate timing logs to cascaded exploding bar-chart "
+                    "data (json with data and bar_labels)")
+    parser.add_argument("log", help="json lines, csv or tsv log file")
+    parser.add_argument("--format", choices=("jsonl", "csv", "tsv"),
+                        default=None,
+                        help="default from the file extension")
+    parser.add_argument("--follow", action="store_true",
+                        help="print the aggregate again when lines are "
+                             "appended")
+    parser.add_argument("--interval", type=float, default=1.0,
+                        help="seconds between polls of the file in --follow")
+    parser.add_argument("--colors", default=None,
+                        help="json file with the colors of the categories, "
+                             "the new categories are added to it")
+    args = parser.parse_args(argv)
+
+    colors = {}
+    if args.colors and os.path.exists(args.colors):
+        with open(args.colors) as colors_file:
+            colors = json.load(colors_file)
+
+    try:
+        if not args.follow:
+            data, bar_labels = load_cascade(args.log, args.format,
+                                            colors=colors)
+            print(json.dumps({"data": data, "bar_labels": bar_labels}))
+            return 0
+
+        try:
+            for data, bar_labels in follow_cascade(args.log, args.format,
+                                                   args.interval,
+                                                   colors=colors):
+                print(json.dumps({"data": data, "bar_labels": bar_labels}))
+                sys.stdout.flush()
+        except KeyboardInterrupt:
+            pass
+        return 0
+    finally:
+        if args.colors:
+            with open(args.colors, "w") as colors_file:
+                json.dump(colors, colors_file, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+"""
+Drill-down cascades from tree structured profiles
+
+Builds the cascade of a call-tree or timer hierarchy along a path of nodes:
+the first stack holds the children of the root, every next stack the
+children of the node expanded in the stack before it, with a wedge from that
+node to the whole next stack. Only the nodes on the path and their children
+are visited: the values of the children are taken from the nodes, only a
+node without a value is aggregated from its subtree. The rest of the tree
+is never evaluated, also not when children are produced lazily.
+
+Nodes are dicts {"name":..., "value":..., "children": [...], "color":...}
+(value and color optional), other trees are supported with the name, value,
+children and color accessor functions:
+
+    data, emphasis, bar_labels = drilldown(profile, ["solver", "assemble"])
+    cascaded_exploding_barcharts(ax, data, emphasis, bar_labels, "percentage")
+
+    # or for objects, drawn in one go
+    drilldown_barcharts(ax, root, ["solver", "assemble"],
+                        children=lambda node: node.children,
+                        value=lambda node: node.inclusive_time)
+
+When the children of a node do not add up to its value the rest is shown as
+a "self" box (the time spent in the node itself).
+"""
+from cascade_loader import CategoryColors
+
+import cascadedexplodingbarcharts as cebc
+
+
+def _dict_name(node):
+    return node["name"]
+
+
+def _dict_value(node):
+    return node.get("value")
+
+
+def _dict_children(node):
+    return node.get("children") or ()
+
+
+def _dict_color(node):
+    return node.get("color")
+
+
+def _percentage(value, total):
+    return "%.0f%%" % (100. * value / total) if total else None
+
+
+class _TreeAccess(object):
+    """
+    The accessors of a tree
+    """
+
+    def __init__(self, name, value, children, color):
+        self.name = name
+        self.value_of = value
+        self.children = children
+        self.color = color
+        # id -> (node, value) of the aggregated nodes, the node is kept so
+        # its id is not reused
+        self._sums = {}
+
+    def _known(self, node):
+        value = self.value_of(node)
+        if value is not None:
+            return float(value)
+        if id(node) in self._sums:
+            return self._sums[id(node)][1]
+        return None
+
+    def value(self, node):
+        value = self._known(node)
+        if value is not None:
+            return value
+        # Only nodes without a value are aggregated from their subtree: a
+        # post-order walk without recursion (deep trees), every node is
+        # visited once and each parent sums the values of its children
+        walk = [[node, iter(self.children(node)), 0.]]
+        while True:
+            entry = walk[-1]
+            for child in entry[1]:
+                value = self._known(child)
+                if value is None:
+                    walk.append([child, iter(self.children(child)), 0.])
+                    break
+                entry[2] += value
+            else:
+                walk.pop()
+                self._sums[id(entry[0])] = (entry[0], entry[2])
+                if not walk:
+                    return entry[2]
+                walk[-1][2] += entry[2]
+
+
+def _find_child(children, names, step):
+    """
+    Helper function returning the position of the path step (a child name or
+    index) in the children of a node
+    """
+    if isinstance(step, str):
+        if step not in names:
+            raise ValueError("no child named %r on the path" % step)
+        return names.index(step)
+    if not -len(children) <= step < len(children):
+        raise ValueError("no child %r on the path" % step)
+    return step % len(children)
+
+
+def drilldown(root, path, name=None, value=None, children=None, color=None,
+              top=None, self_label="self", self_color="#dddddd",
+              other_label="other", other_color="#bbbbbb",
+              wedge_label=_percentage, colors=None):
+    """
+    Build the cascade drilling down into root along path
+
+    root:   the root node of the tree
+    path:   the nodes to expand, each a child name (or index) of the node
+            expanded before it (the first one a child of root)
+    name, value, children, color: the accessors of the nodes, functions
+            called with a node. Default for dict nodes, see module docstring.
+            children may return a generator, it is only called for the nodes
+            on the path. Without color each new name gets the next unused
+            palette color (see cascade_loader.CategoryColors).
+    top:    None or the maximal number of children per stack, the smallest
+            children are merged into one other box (the expanded child is
+            always kept)
+    self_label, self_color: the box for the part of a node's value not in
+            its children, None to leave it out
+    other_label, other_color: the box with the merged children (top)
+    wedge_label: function(value, total) returning the label of the wedge
+            from the expanded box, default its percentage of the stack
+    colors: None or a dict name -> color of the automatic colors, seeds them
+            (e.g. to keep the colors between drill-downs) and receives the
+            new names
+
+    Returns data, emphasis and bar_labels for cascaded_exploding_barcharts
+    """
+    access = _TreeAccess(name or _dict_name, value or _dict_value,
+                         children or _dict_children, color or _dict_color)
+    category_colors = CategoryColors(colors=colors)
+    data = []
+    emphasis = []
+    bar_labels = []
+    node = root
+    node_value = access.value(root)
+    for depth in range(len(path) + 1):
+        nodes = list(access.children(node))
+        names = [access.name(child) for child in nodes]
+        values = [access.value(child) for child in nodes]
+        expanded = None
+        if depth < len(path):
+            expanded = _find_child(nodes, names, path[depth])
+            next_node, next_value = nodes[expanded], values[expanded]
+
+        stack = [[values[idx], names[idx], access.color(nodes[idx]) or
+                  category_colors(names[idx])] for idx in range(len(nodes))]
+        if top is not None and len(stack) > top:
+            # Keep the largest children (and the expanded one) in tree order
+            largest = sorted(range(len(stack)), key=lambda idx: -values[idx])
+            kept = set(largest[:max(top - 1, 0)])
+            if expanded is not None:
+                kept.add(expanded)
+            other = sum(values[idx] for idx in range(len(stack))
+                        if idx not in kept)
+            if expanded is not None:
+                expanded = sorted(kept).index(expanded)
+            stack = [stack[idx] for idx in sorted(kept)]
+            stack.append([other, other_label, other_color])
+
+        own = node_value - sum(values)
+        if self_label is not None and own > 1e-9 * abs(node_value):
+            stack.append([own, self_label, self_color])
+
+        data.append(stack)
+        bar_labels.append(access.name(node))
+        if expanded is None:
+            emphasis.append(None)
+            break
+        total = sum(entry[0] for entry in stack)
+        label = wedge_label(stack[expanded][0], total) if wedge_label \
+                else None
+        emphasis.append([[[expanded, expanded, label], [0, None, None]]])
+        node, node_value = next_node, next_value
+    return data, emphasis, bar_labels
+
+
+def drilldown_barcharts(ax, root, path, representation="percentage",
+                        batch=None, lod=None, style=None, **tree_options):
+    """
+    Draw the drill-down cascade of root along path on ax (tree_options: see
+    drilldown), returns the handle of cascaded_exploding_barcharts
+    """
+    data, emphasis, bar_labels = drilldown(root, path, **tree_options)
+    return cebc.cascaded_exploding_barcharts(ax, data, emphasis, bar_labels,
+                                             representation, batch, lod,
+                                             style=style)
@@ -1,8 +1,14 @@
 import numpy
-import matplotlib.pyplot as plt
+from collections import OrderedDict
+import io
 import copy
-from matplotlib.path import Path
-import matplotlib.patches as patches
+import json
+import threading
+import time
+from types import MappingProxyType
+# matplotlib is imported where it is used, importing this module stays fast
+# and pyplot (with the selection of a GUI backend) is only imported by
+# run_example
 
 """
 # cascaded_exploding_bar_chart
@@ -38,6 +44,11 @@ have to do this before the call.
             where each bar-chart is a list of triplets containing:
             [value, label, #color]
             See run_example() for detailed example of data structure
+            For large data use a CascadeData: flat numpy arrays of the values,
+            labels and colors plus the offsets of the stacks. These arrays
+            (also memory mapped ones) are used without copying when the
+            values are float64 and the offsets intp (int64 on 64 bit),
+            other dtypes are converted to a copy.
 
     emphasis: The entries in the bar-chart to emphasize and explode from and TO
             It is a 3d array: A list of triples, setting the range and the label
@@ -47,6 +58,11 @@ have to do this before the call.
             e.g. To create the explosion lines in the graphical example you
             would use range: [[1,2,"EL"],[1,2,"EL"]] 
             Use None for a tripled pair not wanting emphasis 
+            Instead of an index the begin and end of a range can be a box
+            label (begin: the first box with the label, end: the last) or a
+            predicate called with the box labels (begin: the first match,
+            end: the last), e.g. [["bar_1","bar_3","EL"],[0,None,"EL"]].
+            Labels are looked up in a hash index built once per stack.
 
     bar_labels: An optional label to be printed above each stack bar-chart
             (BL in the graphical example)
@@ -60,6 +76,76 @@ have to do this before the call.
             This settings has influence on the y-axis labels and how the 
             label printing is controlled. Also offset might needs to be adapted
 
+    batch:  None: draw every box with a separate ax.bar call (default)
+            "stack": draw the boxes of each stack as two collections, one for
+                     the normal and one for the emphasized boxes
+            "cascade": two collections for the boxes of all stacks
+            Much faster for stacks with many boxes. When batching, all the
+            explosion lines are one LineCollection, all the wedge backgrounds
+            one PolyCollection and the explode labels one collection of text
+            paths (handle.wedge_collections, for per wedge styling). Labels
+            with multiple lines or explode_label_text settings only a Text
+            supports (e.g. rotation, bbox) are drawn as texts.
+
+    lod:    Level of detail: None or a height in pixels. Runs of neighbouring
+            boxes smaller than lod pixels are merged into one "other" box 
+            (typesetting lod_label and lod_color). Boxes in an emphasis range
+            and the explosion lines are always kept exact.
+
+    instrument: None, or something receiving a timed SpanEvent (name, stack,
+            seconds, attributes) for each phase: layout, normalize,
+            explosion_geometry, lod_merge, label_fit, render, render_stack
+            (per stack), render_collections and update. The attributes count
+            e.g. the created artists and the box labels removed by
+            box_size_text_cutoff. Either a callable (e.g. events.append) or
+            an object with a span(event) method returning a context manager,
+            to connect existing tracing:
+
+                class Tracing(object):
+                    def span(self, event):
+                        return tracer.start_as_current_span(event.name)
+
+    rasterize: Mixed raster/vector output for large charts in svg and pdf.
+            The normal boxes, relative bars and wedge backgrounds are
+            rasterized at the dpi of savefig, the labels, explosion lines
+            and emphasized boxes stay vector (much smaller files that open
+            faster). render_to_bytes(..., rasterize=True, raster_dpi=150)
+
+    virtual: Interactive mode for cascades with hundreds of stacks. The
+            layout is kept but only the stacks (and the wedges towards them)
+            inside the x limits are drawn, the artists are created and
+            removed while panning and zooming (xlim_changed). Returns a
+            CascadeViewport handle with the same update() and
+            legend_handles.
+
+    cascaded_exploding_barcharts() returns a handle (CascadeArtists) on the
+    drawn chart. handle.legend_handles can be used for 
+    ax.legend(handles=...) and handle.update(data, emphasis, bar_labels) 
+    changes the drawn chart in place, for example for live data. Only the
+    changed artists are touched (emphasis and bar_labels are kept when None).
+
+## Layout and rendering
+cascaded_exploding_barcharts() computes the layout of the chart and draws it.
+Both steps can also be done separately, e.g. to draw the same chart at
+multiple sizes or to store the computed chart:
+
+    layout = cascade_layout(data, emphasis, bar_labels, "percentage", dpi)
+    render_cascade_layout(ax, layout)
+
+The CascadeLayout is plain data (numpy arrays in data coordinates) and can be
+saved with layout.to_json() or layout.save_npz(file) and loaded with
+CascadeLayout.from_json() or CascadeLayout.load_npz(). The dpi is only used to
+check which box labels fit, the typesetting of the lines, text and boxes is
+applied when rendering.
+
+## Headless rendering
+Importing the module does not import matplotlib, and pyplot is never imported
+(except by run_example). render_to_bytes() draws a chart on its own Figure
+with an Agg canvas and returns the image, without touching the pyplot state:
+
+    png = render_to_bytes(data, emphasis, bar_labels, "percentage",
+                          format="png", dpi=100)
+
 ## Typesetting
 
 Typesetting is controlled by changing the variables in the global variable
@@ -67,6 +153,16 @@ Typesetting is controlled by changing the variables in the global variable
 Default typesetting is for the default matplotlib figure size and of a simple nature
 changing the typesetting should be done before calling cascaded_exploding_barcharts()
 
+The global is the default, for a single chart pass a style instead:
+
+    style = CascadeStyle(box_size_text_cutoff=0.6)
+    cascaded_exploding_barcharts(ax, data, emphasis, bar_labels, style=style)
+
+A CascadeStyle is a validated, read only copy of the typesetting (missing
+entries come from exp_barch_tp_set). Charts with different styles can be
+rendered at the same time in a thread pool, e.g. with render_to_bytes(...,
+style=style).
+
     Control features (True/False):
         box_label: Print the labels in the boxes 
         bar_label: Print a label above each stack
@@ -83,9 +179,10 @@ dictionaries forwarded to either axes.bar axes.line or axes.text functions
 The "zorder" is used to correctly stack the different graphical elements. It
 is not advisable to change these settings.
 
-It is possible to use named color names instead of the #rgb used currently for 
-typesettings EXCEPT the bar color. The gradient method for the border
-is simplistic (borderline buggy / broken) and will fail for non #rgb entries.
+All matplotlib colors (#rgb, named colors, rgba tuples) can be used, also
+for the bar color. The border of a box is derived from the box color with
+box_border_gradient: below 1.0 darkens (0.0 is black), above 1.0 lightens
+(2.0 is white).
 
 ## Graphical example
 ```              
@@ -106,12 +203,8 @@ is simplistic (borderline buggy / broken) and will fail for non #rgb entries.
 
 ## TODOS
 1. bar_labels must always be supplied even when turned off (can be None)
-2. Major loop contains an ugly minus 1
-3. Do something with the global typesetting dict exp_barch_tp_set
-4. Test all corner cases of None types in emphasis
-5. Check if raw plotting wedges are correct
-6. It is possible to use a 'darkened' color for the box border. Lighting
-   should also be possible, but rgb is hard
+2. Test all corner cases of None types in emphasis
+3. Check if raw plotting wedges are correct
 
 ## References:
 [1] "ASSET for JULIA: executing massive parallel spike correlation analysis on a KNL cluster";
@@ -122,6 +215,8 @@ Keywords: python matplotlib exploding exploded barchart barcharts bar-chart bar-
 
 
 def run_example():
+    import matplotlib.pyplot as plt
+
     #############################
     # Define some data to display
     data = [[[2,"foo_1", "#3F8080"],[2,"foo_2", "#346080"], [3,"foo_3", "#30A280"],
@@ -139,10 +234,11 @@ def run_example():
 
     ##############
     # Type setting
-    # all type setting by adapting global_type_setting
-    exp_barch_tp_set["exploding_line"] = {'color':'k', "ls":'--', "lw":1.0}
-    # important settings: controll from what size bar labels are not drawn
-    exp_barch_tp_set["box_size_text_cutoff"]=0.6
+    # the defaults of exp_barch_tp_set with some entries changed
+    style = CascadeStyle(exploding_line={'color':'k', "ls":'--', "lw":1.0},
+                         # important settings: controll from what size bar
+                         # labels are not drawn
+                         box_size_text_cutoff=0.6)
 
     ##############################
     # Create a figure get the axis
@@ -151,24 +247,34 @@ def run_example():
     ############################
     # Main call to functionality
     cascaded_exploding_barcharts(ax, data, emphasis, bar_labels, 
-                                 "percentage")
+                                 "percentage", style=style)
 
     ##############################
     # Some additional makeup of the figure
-    plt.title("Example of cascading exploding bar-charts", fontsize = 17)
-    ax.set_xticks([0, 1, 2])
-    ax.set_xticklabels(["First", "Second", "Third"])
+    chart_makeup(ax, "Example of cascading exploding bar-charts",
+                 ["First", "Second", "Third"])
+    plt.show()
+
+
+def chart_makeup(ax, title=None, stack_labels=None):
+    """
+    The makeup of the example: title, a tick label under each stack, no y-axis
+    ticks and some room around the chart. Call after cascaded_exploding_barcharts
+    """
+    if title:
+        ax.set_title(title, fontsize = 17)
+    if stack_labels:
+        ax.set_xticks(range(len(stack_labels)))
+        ax.set_xticklabels(stack_labels)
 
     ax.set_yticks([])
     ax.set_yticklabels([])
 
-    plt.xlim( -.2, plt.xlim()[1] + .2 )
-    plt.ylim(- plt.ylim()[1] / 15,  plt.ylim()[1] + plt.ylim()[1] / 15)
-    plt.show()
+    ax.set_xlim( -.2, ax.get_xlim()[1] + .2 )
+    ax.set_ylim(- ax.get_ylim()[1] / 15,  ax.get_ylim()[1] + ax.get_ylim()[1] / 15)
    
    
 #Default types settings    
-# TODO: change from global to something else
 exp_barch_tp_set = {
     # Border types for the bar boxes
     "emphasis_box":{ "width":0.5, "lw":2.5, "zorder":3},
@@ -181,7 +287,8 @@ exp_barch_tp_set = {
     "box_size_text_cutoff":1.0,  
     # offset of text in the box
     "box_label_offset":0.2, 
-    # Box border gradient of the box-color, use 0.0 for no black
+    # Box border gradient of the box-color, use 0.0 for black, values above
+    # 1.0 lighten the color (2.0 is white)
     "box_border_gradient":0.2,
 
     # label above the bars
@@ -215,152 +322,548 @@ exp_barch_tp_set = {
     "explode_bg":True,
     "explode_bg_xs_offset":0.009,
     "explode_bg_ys_offset":0.0013,
-    "explode_bg_vert":{"facecolor":"#eeeeee", "lw":0, "zorder":1}
+    "explode_bg_vert":{"facecolor":"#eeeeee", "lw":0, "zorder":1},
+
+    # Level of detail (lod): label and color of the merged small boxes
+    "lod_label":"other",
+    "lod_color":"#c7c7c7"
 
     } 
 
-def convert_color(color, multiplicateion_factor=1.0):
+
+# The kind of value of each typesetting entry, checked by CascadeStyle
+_style_kinds = {
+    "dict": ("emphasis_box", "normal_box", "box_label_text", "bar_label_text",
+             "relative_box", "exploding_line", "explode_label_text",
+             "explode_bg_vert"),
+    "bool": ("box_label", "bar_label", "relative", "explode_label",
+             "explode_bg"),
+    "number": ("box_size_text_cutoff", "box_label_offset",
+               "box_border_gradient", "bar_label_offset",
+               "relative_box_h_offset", "explode_label_offset_left",
+               "explode_label_v_offset_left", "explode_label_offset_right",
+               "explode_label_v_offset_right", "explode_bg_xs_offset",
+               "explode_bg_ys_offset"),
+    "str": ("lod_label", "lod_color")}
+
+
+def _frozen(value):
+    # Read only copies of the (nested) typesetting dicts
+    if isinstance(value, dict):
+        return MappingProxyType(dict((key, _frozen(item))
+                                     for key, item in value.items()))
+    if isinstance(value, list):
+        return tuple(_frozen(item) for item in value)
+    return value
+
+
+class CascadeStyle(object):
+    """
+    Immutable typesetting of a chart: a validated copy of the entries of
+    exp_barch_tp_set (see Typesetting), with some derived values computed
+    once. A style can be passed to cascaded_exploding_barcharts (style=...)
+    for a single chart, changing exp_barch_tp_set afterwards does not change
+    it. Styles can be shared between threads.
+
+    settings:  dict with typesetting entries, the missing entries are taken
+               from exp_barch_tp_set (None: exp_barch_tp_set as it is now)
+    overrides: typesetting entries as keywords, e.g. box_size_text_cutoff=0.6
+
+    style["normal_box"] etc. give the (read only) entries, replace() returns
+    a new style with some entries changed.
     """
-    Helper function transforms a #AABBCC color to a different color by
-    multiplying with a factor   
 
-    There are probably better ways but
-    NO ERROR CHECKING, use at your own risk!!
+    def __init__(self, settings=None, **overrides):
+        merged = dict(exp_barch_tp_set)
+        merged.update(settings or {})
+        merged.update(overrides)
+        merged = copy.deepcopy(merged)
+        self._validate(merged)
+        object.__setattr__(self, "settings", _frozen(merged))
+
+        # Derived values used when drawing
+        derived = {
+            # The box settings for ax.bar / collections (width is used in the
+            # layout), keyed on emphasis
+            "box_kwargs": {False: _without_width(merged["normal_box"]),
+                           True: _without_width(merged["emphasis_box"])},
+            "box_width": {False: float(merged["normal_box"]["width"]),
+                          True: float(merged["emphasis_box"]["width"])},
+            "relative_box_kwargs": _without_width(merged["relative_box"]),
+            "relative_box_width": float(merged["relative_box"]["width"]),
+            # In percentage the y offset is corrected
+            "explode_bg_ys_offsets": {
+                "percentage": 100. * merged["explode_bg_ys_offset"]},
+            }
+        for key, value in derived.items():
+            object.__setattr__(self, key, _frozen(value))
+
+    @staticmethod
+    def _validate(settings):
+        known = set(key for keys in _style_kinds.values() for key in keys)
+        for key in settings:
+            if key not in known:
+                raise ValueError("unknown typesetting entry %r" % (key,))
+        for kind, keys in _style_kinds.items():
+            for key in keys:
+                value = settings.get(key)
+                if kind == "dict":
+                    valid = isinstance(value, dict)
+                elif kind == "bool":
+                    valid = isinstance(value, (bool, numpy.bool_))
+                elif kind == "number":
+                    valid = isinstance(value, (int, float, numpy.number)) \
+                            and not isinstance(value, bool)
+                else:
+                    valid = isinstance(value, str)
+                if not valid:
+                    raise ValueError("typesetting entry %r should be a %s, "
+                                     "not %r" % (key, kind, value))
+        for key in ("emphasis_box", "normal_box", "relative_box"):
+            if "width" not in settings[key]:
+                raise ValueError("typesetting entry %r needs a width" % key)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CascadeStyle is immutable, use replace()")
+
+    def __getitem__(self, key):
+        return self.settings[key]
+
+    def __contains__(self, key):
+        return key in self.settings
+
+    def keys(self):
+        return self.settings.keys()
+
+    def explode_bg_ys_offset(self, representation):
+        return self.explode_bg_ys_offsets.get(
+            representation, self.settings["explode_bg_ys_offset"])
+
+    def replace(self, **overrides):
+        """
+        Returns a new style with the entries in overrides changed
+        """
+        return CascadeStyle(self.to_dict(), **overrides)
+
+    def to_dict(self):
+        """
+        Returns the typesetting as a plain (mutable) dict
+        """
+        def thawed(value):
+            if isinstance(value, MappingProxyType):
+                return dict((key, thawed(item)) for key, item in value.items())
+            return value
+        return thawed(self.settings)
+
+
+def cascade_style(style=None):
     """
+    Helper function returning the CascadeStyle for a style argument: a
+    CascadeStyle as it is, a dict of typesetting entries or None for the
+    current exp_barch_tp_set
+    """
+    if isinstance(style, CascadeStyle):
+        return style
+    return CascadeStyle(style)
 
-    new_color = "#"
+def text_font_properties(text_kwargs):
+    """
+    Helper function that creates the FontProperties that ax.text would use
+    for a dictionary of text settings (e.g. exp_barch_tp_set["box_label_text"])
+    """
+    from matplotlib.font_manager import FontProperties
+
+    font = None
+    for key in ("fontproperties", "font_properties", "font"):
+        if key in text_kwargs:
+            font = text_kwargs[key]
+    if isinstance(font, FontProperties):
+        return font.copy()
+    if isinstance(font, str):
+        return FontProperties(fname=font)
+
+    def get(*keys):
+        for key in keys:
+            if key in text_kwargs:
+                return text_kwargs[key]
+        return None
+
+    return FontProperties(family=get("family", "fontfamily"),
+                          style=get("style", "fontstyle"),
+                          variant=get("variant", "fontvariant"),
+                          weight=get("weight", "fontweight"),
+                          stretch=get("stretch", "fontstretch"),
+                          size=get("size", "fontsize"))
+
+
+class TextMetrics(object):
+    """
+    Measures the size in pixels of text labels from the font properties and the
+    dpi, without creating a text artist per label: a single unattached Text
+    per dpi (and linespacing) is measured with the same layout code (Text.get_window_extent)
+    as drawn texts. Multi line, math and rotated text are supported.
 
-    # Add mutated first rgb
-    for first, second in [(1,2), (3,4), (5,6)]:
+    Measured sizes are kept in a LRU cache keyed on (label, font, dpi). A
+    single instance can be shared between charts and threads.
+    """
 
-        color_hex = "0x" + color[first] + color[second]
-        color_changed =  hex(int(int(color_hex, 16) * multiplicateion_factor))
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._renderers = {}
+        self._texts = {}
+        self._lock = threading.RLock()
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def _renderer(self, dpi):
+        # A 1x1 pixel renderer per dpi, only used for the text metrics
+        if dpi not in self._renderers:
+            from matplotlib.backends.backend_agg import RendererAgg
+            self._renderers[dpi] = RendererAgg(1, 1, dpi)
+        return self._renderers[dpi]
+
+    def _text(self, dpi, linespacing):
+        # A Text on its own Figure per dpi, only used for the text metrics
+        key = (dpi, linespacing)
+        if key not in self._texts:
+            from matplotlib.figure import Figure
+            from matplotlib.text import Text
+            text = Text(0, 0, "", linespacing=linespacing)
+            text.set_figure(Figure(dpi=dpi))
+            self._texts[key] = text
+        return self._texts[key]
+
+    def _line_metrics(self, line, prop, usetex, dpi):
+        if usetex:
+            ismath = "TeX"
+        else:
+            from matplotlib.cbook import is_math_text
+            ismath = is_math_text(line)
+            if ismath:
+                # Same unescaping as matplotlib does for math text
+                line = line.replace(r"\$", "$")
+        return self._renderer(dpi).get_text_width_height_descent(
+            line, prop, ismath)
+
+    def line_metrics(self, line, prop, dpi, usetex=False):
+        """
+        Returns the (width, height, descent) in pixels of a single line of
+        text, as measured by the renderer (without the minimal line height
+        of Text)
+        """
+        with self._lock:
+            key = ("line", line, prop, dpi, usetex)
+            if key in self._cache:
+                self.hits += 1
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            self.misses += 1
+            result = self._line_metrics(line, prop, usetex, dpi)
+            self._cache[key] = result
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+            return result
+
+    def size(self, label, prop, dpi, usetex=False, linespacing=None):
+        """
+        Returns the (width, height) in pixels of the unrotated label, as
+        ax.text with the font properties prop (linespacing None is the
+        default of Text)
+        """
+        with self._lock:
+            return self._size(label, prop, dpi, usetex, linespacing)
+
+    def _size(self, label, prop, dpi, usetex, linespacing):
+        label = "" if label is None else str(label)
+        key = (label, prop, dpi, usetex, linespacing)
+        if key in self._cache:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        self.misses += 1
+        if label == "":
+            result = (0., 0.)
+        else:
+            text = self._text(dpi, linespacing)
+            text.set_text(label)
+            text.set_fontproperties(prop)
+            text.set_usetex(usetex)
+            bbox = text.get_window_extent(self._renderer(dpi))
+            result = (bbox.width, bbox.height)
+
+        self._cache[key] = result
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        return result
+
+    def heights(self, labels, text_kwargs, dpi):
+        """
+        Returns a numpy array with the heights in pixels of the labels when
+        drawn with ax.text(..., **text_kwargs) on a figure with dpi
+        """
+        from matplotlib import rcParams
+
+        prop = text_font_properties(text_kwargs)
+        usetex = text_kwargs.get("usetex", rcParams["text.usetex"])
+        linespacing = text_kwargs.get("linespacing")
+        sizes = numpy.array([self.size(label, prop, dpi, usetex, linespacing)
+                             for label in labels], dtype=float).reshape(-1, 2)
+
+        rotation = text_kwargs.get("rotation", 0.)
+        if rotation == "vertical":
+            rotation = 90.
+        elif rotation in (None, "horizontal"):
+            rotation = 0.
+        if rotation == 0.:
+            return sizes[:, 1]
+        angle = numpy.radians(float(rotation))
+        return numpy.abs(sizes[:, 0] * numpy.sin(angle)) + \
+               numpy.abs(sizes[:, 1] * numpy.cos(angle))
+
+
+# Shared cache of measured labels
+text_metrics = TextMetrics()
+
+
+def shade_rgba(rgba, gradient=1.0):
+    """
+    Helper function that darkens or lightens (n, 4) RGBA colors
+    gradient < 1.0: darken by multiplying the 8 bit rgb channels with
+                    gradient, truncated as the #rrggbb conversion did (0.0 is
+                    black)
+    gradient > 1.0: lighten by mixing with white, 2.0 is white
+    The alpha is not changed
+    """
+    shaded = numpy.array(rgba, dtype=float)
+    if gradient <= 1.0:
+        shaded[..., :3] = numpy.floor(numpy.round(shaded[..., :3] * 255.) *
+                                      max(gradient, 0.)) / 255.
+    else:
+        shaded[..., :3] += (1. - shaded[..., :3]) * (min(gradient, 2.) - 1.)
+    return numpy.clip(shaded, 0., 1.)
 
-        if color_changed > hex(0xFF):
-            color_changed = 0xFF
 
+class ColorCache(object):
+    """
+    Resolves colors (#rgb, named, tuples) to RGBA arrays with the matplotlib
+    color conversion. Each distinct color is converted once and kept, stacks
+    normally reuse the same palette many times. A single instance can be
+    shared between charts and threads (at worst a color is converted twice).
+    """
 
-        if len(str(color_changed)[2:4]) == 1:
-            new_color += "0"
-        new_color += str(color_changed)[2:4]
+    def __init__(self):
+        self._rgba = {}
+        self._shaded = {}
+
+    def clear(self):
+        self._rgba.clear()
+        self._shaded.clear()
+
+    @staticmethod
+    def _key(color):
+        if isinstance(color, str):
+            return color
+        return tuple(numpy.asarray(color, dtype=float).ravel())
+
+    def _palette(self, colors):
+        # Returns the distinct color keys and the index of each color in it
+        index = {}
+        codes = numpy.empty(len(colors), dtype=numpy.intp)
+        for idx, color in enumerate(colors):
+            codes[idx] = index.setdefault(self._key(color), len(index))
+        return list(index), codes
+
+    def _lookup(self, key):
+        if key not in self._rgba:
+            from matplotlib.colors import to_rgba
+            self._rgba[key] = to_rgba(key)
+        return self._rgba[key]
+
+    def _lookup_shaded(self, key, gradient):
+        if (key, gradient) not in self._shaded:
+            self._shaded[(key, gradient)] = tuple(
+                shade_rgba(self._lookup(key), gradient))
+        return self._shaded[(key, gradient)]
+
+    def rgba(self, colors):
+        """
+        Returns an (n, 4) RGBA array of the colors
+        """
+        keys, codes = self._palette(colors)
+        palette = numpy.array([self._lookup(key) for key in keys],
+                              dtype=float).reshape(-1, 4)
+        return palette[codes]
+
+    def shaded_rgba(self, colors, gradient):
+        """
+        Returns an (n, 4) RGBA array of the darkened or lightened colors,
+        see shade_rgba (used for the box borders: box_border_gradient)
+        """
+        keys, codes = self._palette(colors)
+        palette = numpy.array([self._lookup_shaded(key, gradient)
+                               for key in keys], dtype=float).reshape(-1, 4)
+        return palette[codes]
+
+
+# Shared cache of converted colors
+color_cache = ColorCache()
 
-    return new_color
 
-def create_bar_chart_with_emphasis(ax, data, emphasis = None,
-                                   bar_label = None,
-                                   bar_sum = None,
-                                   stack_idx = 0):
+def convert_color(color, multiplicateion_factor=1.0):
     """
-    Create a stacked bar-chart with some bars emphasised and a lable in the box
-    data: list of [value, label, #color]
-    emphasis: pair of boxes to emphasize
-    bar_label: text to print above the stack
-    stack_idx: Which stack we are working on
+    Helper function transforms a color to a different color by multiplying
+    with a factor (darken) or, for factors above 1.0, mixing with white
+    (lighten). Accepts all matplotlib colors, returns a #rrggbb(aa) string.
+    For many colors use color_cache.shaded_rgba
     """
-    pos_sum = 0.
-    bar_dict = {}   # Needed for getting the location of the emphasis 
+    rgba = color_cache.shaded_rgba([color], multiplicateion_factor)[0]
+    from matplotlib.colors import to_hex
+    return to_hex(rgba, keep_alpha=rgba[3] < 1.)
 
-    if exp_barch_tp_set["box_label"]:
-        # Ugly hack but needed to get the size of the printed text,
-        # But mhe.. who cares JOLO!!!
-        renderer = ax.figure.canvas.get_renderer()
 
-    # If we have data in the emphasis array get the ranges
-    # We can have multiple ranges, create a list of emphasis boxes
-    emph_boxes = []
-    if emphasis and emphasis[0]:   
-        emph = True
-        # we can have one or more emphasis description
-        for emph_entry in emphasis:
-            # plus one to get inclusive range
-
-            for idx in range(emph_entry[0][0], emph_entry[0][1] + 1):
-                emph_boxes.append(idx)
-    else:
-        emph = False
+class SpanEvent(object):
+    """
+    A timed span of work, send to the instrument of
+    cascaded_exploding_barcharts (see instrument there)
+
+    name:       the phase: layout, normalize, explosion_geometry, lod_merge,
+                layout_stacks, label_fit, render, render_stack,
+                render_collections or update
+    stack:      the stack index for the per stack spans, otherwise None
+    start:      time.perf_counter() at the start of the span
+    seconds:    duration of the span (None while running)
+    attributes: dict with counts, e.g. artists (number created),
+                labels_removed (box labels not drawn due to
+                box_size_text_cutoff), boxes
+    """
 
+    def __init__(self, name, stack=None):
+        self.name = name
+        self.stack = stack
+        self.start = None
+        self.seconds = None
+        self.attributes = {}
 
-    # The boxes are drawn from bottom to top. This causes emphasis box top
-    # line to be overdrawn of there are more written after. Save the top fat box
-    # and redraw
-    box_to_redraw = None
+    def set(self, key, value):
+        self.attributes[key] = value
 
-    for idx in range(len(data)):
-        (value, label, color) = data[idx]
-        box_settings = exp_barch_tp_set["normal_box"]
-        # If we are drawing with emph and we are in the range
-        if emph and idx in emph_boxes:
-                box_settings = exp_barch_tp_set["emphasis_box"]
+    def __repr__(self):
+        return "SpanEvent(%r, stack=%r, seconds=%r, %r)" % (
+            self.name, self.stack, self.seconds, self.attributes)
 
 
-        edge_color = convert_color(color, 
-                          exp_barch_tp_set["box_border_gradient"])
+class _Span(object):
+    """
+    Context manager timing a SpanEvent and sending it to the instrument
+    """
 
-        # Draw the bar, save it because we might need to redraw
+    def __init__(self, instrument, name, stack=None):
+        self.instrument = instrument
+        self.event = SpanEvent(name, stack)
+        self.context = None
 
-        last_bar = ax.bar(stack_idx, value, bottom=pos_sum, color=color, 
-                    align='edge', edgecolor=edge_color,
-                    label=label, **box_settings)
+    def __enter__(self):
+        if hasattr(self.instrument, "span"):
+            self.context = self.instrument.span(self.event)
+            self.context.__enter__()
+        self.event.start = time.perf_counter()
+        return self.event
 
-          
-        if exp_barch_tp_set["box_label"]:
-            text_var = ax.text(stack_idx + exp_barch_tp_set["box_label_offset"],
-                               pos_sum + 0.5 * value,
-                    label, **exp_barch_tp_set["box_label_text"])
+    def __exit__(self, *exc_info):
+        self.event.seconds = time.perf_counter() - self.event.start
+        if self.context is not None:
+            return self.context.__exit__(*exc_info)
+        self.instrument(self.event)
 
-            # Now check the size of the printed text (can only be done
-            # after drawing)                               
-            text_height = \
-                text_var.get_window_extent(renderer=renderer).height
-            # Remove if larger then some user controlled size
-            box_size_text_cutoff = exp_barch_tp_set["box_size_text_cutoff"]
 
-            if (text_height * box_size_text_cutoff) > value:
-                text_var.remove()
+class _NoSpan(object):
+    """
+    The span used without instrument: does nothing
+    """
 
-        pos_sum += value
+    def __enter__(self):
+        return self
 
-    # Add the label of the bar (if there)
-    if exp_barch_tp_set["bar_label"] and bar_label:
-        text_var = ax.text(stack_idx + exp_barch_tp_set["bar_label_offset"],
-                          pos_sum, bar_label,
-                          **exp_barch_tp_set["bar_label_text"])
+    def __exit__(self, *exc_info):
+        pass
 
-    # Add the relative size bar
-    # TODO: Make selectable
-    if exp_barch_tp_set["relative"]:
-        ax.bar(stack_idx + exp_barch_tp_set["relative_box_h_offset"],
-           bar_sum, bottom=0, color='k', 
-                    align='edge', 
-                    label=label, **exp_barch_tp_set["relative_box"])
+    def set(self, key, value):
+        pass
+
+
+_no_span = _NoSpan()
+
+
+def _span(instrument, name, stack=None):
+    """
+    Helper function returning the span context manager for instrument
+    """
+    if instrument is None:
+        return _no_span
+    return _Span(instrument, name, stack)
+
+
+def _span_count(span, artists):
+    """
+    Helper function returning the number of artists for a span, without
+    instrument they are not counted
+    """
+    if span is _no_span:
+        return 0
+    return artists.count()
+
+
+def create_bar_chart_with_emphasis(ax, data, emphasis = None,
+                                   bar_label = None,
+                                   bar_sum = None,
+                                   stack_idx = 0,
+                                   batch = None):
+    """
+    Create a stacked bar-chart with some bars emphasised and a lable in the box
+    data: list of [value, label, #color] or StackData
+    emphasis: pair of boxes to emphasize
+    bar_label: text to print above the stack
+    stack_idx: Which stack we are working on
+    batch: None, draw each box with a separate ax.bar call
+           "stack": draw the boxes of this stack as collections
+
+    Returns the legend proxy handles of the boxes when batching
+    """
+    data = StackData.from_data(data)
+    cascade = CascadeData(data.values, [0, len(data)], data.labels,
+                          data.colors)
+    style = cascade_style()
+    layout = CascadeLayout(1, dpi=ax.figure.dpi, **_layout_stacks(
+        cascade, [bar_sum], _emphasis_mask(cascade, [emphasis]), [bar_label],
+        ax.figure.dpi, style, first_stack=stack_idx))
+    artists = render_cascade_layout(ax, layout, batch, style=style)
+    if batch is None:
+        return None
+    return artists.legend_handles
 
 
 def explosion_line_y_top_and_bottom(data, emphasis):
     """
     Helper function that returns the top and bottom y locations based on the
     data en the emphasized range supplied for a SINGLE bar-chart
-    """
-    top = 0.
-    bottom = 0.   
 
-    if emphasis is None:
-        return   # early exit, but no return because, there might be emph on right
-
-    for i, (value, label, color) in enumerate(data):           
-        top += value  # We need the top so always add  
-        # If we have found the data index for the top box
-        if emphasis[1] is i:    # If none it will never match and just
-            break # fall out the loop
-
-        # Now bottom box
-        if emphasis[0] is None:  # Take the bottom ==> id == 0
-            bottom = 0.
-        if i < emphasis[0]:      # If we are not yet at the bottom box
-            bottom += value
-        else:
-            pass  # We are done, we need the bottom so no adding of value
-
-    return top, bottom
+    A None range covers the whole stack, a None begin (end) in the range
+    starts at the bottom (ends at the top) of the stack.
+    """
+    data = StackData.from_data(data)
+    bounds = numpy.zeros(len(data) + 1)
+    numpy.cumsum(data.values, out=bounds[1:])
+    bottom, top = _range_bound_indices(emphasis, len(data),
+                                       StackLabelIndex(data.labels))
+    return bounds[top], bounds[bottom]
 
 
 def explosion_line_y_points(data, data2, emphasis):
@@ -396,6 +899,161 @@ def explosion_line_y_points(data, data2, emphasis):
            [y_begin_top_line, y_end_top_line]
 
 
+class StackLabelIndex(object):
+    """
+    Hash index of the box labels of a stack, to resolve emphasis ranges given
+    as labels: label -> position of the first and of the last box with that
+    label. Built on the first lookup, once per stack.
+    """
+
+    def __init__(self, labels):
+        self.labels = labels
+        self._first = None
+        self._last = None
+
+    def _build(self):
+        self._first = {}
+        self._last = {}
+        for idx, label in enumerate(self.labels):
+            self._first.setdefault(label, idx)
+            self._last[label] = idx
+
+    def position(self, bound, last=False):
+        """
+        Returns the position of the range bound in the stack: an index is
+        returned as is, a label gives the first box with that label (with
+        last the last box), a predicate (called with each label) the first
+        (last) box it is true for
+        """
+        if isinstance(bound, str):
+            if self._first is None:
+                self._build()
+            positions = self._last if last else self._first
+            if bound not in positions:
+                raise ValueError("no box labeled %r in the stack" % bound)
+            return positions[bound]
+        if callable(bound):
+            matches = [idx for idx, label in enumerate(self.labels)
+                       if bound(label)]
+            if not matches:
+                raise ValueError("no box in the stack matches %r" % bound)
+            return matches[-1] if last else matches[0]
+        return int(bound)
+
+
+def _range_bound_indices(emph_range, size, index=None):
+    """
+    Helper function that returns the index of the bottom and the top bound
+    of the inclusive emphasis range [begin, end, label] in a stack of size
+    entries (the bounds of a stack are the cumulative sum starting at 0)
+    index: the StackLabelIndex of the stack, for begin and end given as
+    labels or predicates
+    """
+    if index is None:
+        index = StackLabelIndex(())
+    begin, end = 0, size
+    if emph_range is not None:
+        if emph_range[0] is not None:
+            begin = min(max(index.position(emph_range[0]), 0), size)
+        if emph_range[1] is not None:
+            end = min(max(index.position(emph_range[1], last=True) + 1, 0),
+                      size)
+    return begin, end
+
+
+def _stack_emphasis(emphasis, stack_idx):
+    """
+    Helper function returning the emphasis subsets of a stack, without the
+    None entries
+    """
+    if emphasis is None or not 0 <= stack_idx < len(emphasis) or \
+       emphasis[stack_idx] is None:
+        return []
+    return [subset for subset in emphasis[stack_idx] if subset is not None]
+
+
+def _range_label(emph_range):
+    """
+    Helper function returning the label of an emphasis range (or None)
+    """
+    if emph_range is None or len(emph_range) < 3:
+        return None
+    return emph_range[2]
+
+
+class ExplosionGeometry(object):
+    """
+    The y locations of the explosion lines of all the wedges in a cascade,
+    one entry per wedge ordered on the stack the wedge starts from
+
+    chart_ids: the stack each wedge starts from
+    ys_bottom: (n_wedges, 2) array with the [left, right] y of the bottom line
+    ys_top:    (n_wedges, 2) array with the [left, right] y of the top line
+    subsets:   the emphasis subset of each wedge
+    """
+
+    def __init__(self, chart_ids, ys_bottom, ys_top, subsets):
+        self.chart_ids = chart_ids
+        self.ys_bottom = ys_bottom
+        self.ys_top = ys_top
+        self.subsets = subsets
+
+    def __len__(self):
+        return len(self.chart_ids)
+
+    def chart_wedges(self, chart_id):
+        """
+        Returns the range of wedge indices starting from stack chart_id
+        """
+        begin, end = numpy.searchsorted(self.chart_ids,
+                                        [chart_id, chart_id + 1])
+        return range(begin, end)
+
+    def labels(self, side):
+        """
+        Returns the labels of the left (side 0) or right (side 1) ranges
+        """
+        return [_range_label(subset[side]) for subset in self.subsets]
+
+
+def explosion_geometry(data, emphasis):
+    """
+    Computes the explosion line end points of all the wedges in the cascade in
+    one pass using the cumulative sum index of the stacks (see
+    CascadeData.boundaries). Returns an ExplosionGeometry.
+
+    data:     list of stacks or CascadeData (already normalized)
+    emphasis: the emphasis as supplied to cascaded_exploding_barcharts, None
+              entries are skipped and None ranges cover the whole stack
+    """
+    cascade = CascadeData.from_data(data)
+    bounds, starts = cascade.boundaries()
+    sizes = numpy.diff(cascade.offsets)
+
+    chart_ids = []
+    subsets = []
+    indices = []   # bottom and top bound index for the left and right side
+    for chart_id in range(len(cascade) - 1):
+        for subset in _stack_emphasis(emphasis, chart_id):
+            chart_ids.append(chart_id)
+            subsets.append(subset)
+            indices.append(
+                _range_bound_indices(subset[0], sizes[chart_id],
+                                     cascade.label_index(chart_id)) +
+                _range_bound_indices(subset[1], sizes[chart_id + 1],
+                                     cascade.label_index(chart_id + 1)))
+
+    chart_ids = numpy.array(chart_ids, dtype=numpy.intp)
+    indices = numpy.array(indices, dtype=numpy.intp).reshape(-1, 4)
+    left = starts[chart_ids]
+    right = starts[chart_ids + 1]
+    ys_bottom = numpy.column_stack((bounds[left + indices[:, 0]],
+                                    bounds[right + indices[:, 2]]))
+    ys_top = numpy.column_stack((bounds[left + indices[:, 1]],
+                                 bounds[right + indices[:, 3]]))
+    return ExplosionGeometry(chart_ids, ys_bottom, ys_top, subsets)
+
+
 def explosion_line_x_points(stack_idx=0):
     """
     Helper function to create x-location based on the stack_idx
@@ -404,122 +1062,1538 @@ def explosion_line_x_points(stack_idx=0):
            [stack_idx + 0.50, stack_idx + 0.99]
 
 
-def display_explosion(ax, data, emphasis, representation, chart_id=0):
+def display_explosion(ax, data, emphasis, representation, chart_id=0,
+                      ys_bottom_line=None, ys_top_line=None):
     """
     Helper function to draw the explosion lines and labels
+    The y locations of the lines are calculated from the data when not
+    supplied (see explosion_geometry)
     """
     if emphasis is None:
         return
 
     # The start and endpoints of the exploding line depends on the data
-    ys_bottom_line, ys_top_line = explosion_line_y_points(
+    if ys_bottom_line is None or ys_top_line is None:
+        ys_bottom_line, ys_top_line = explosion_line_y_points(
                             data[chart_id], data[chart_id+1], emphasis)
-    xs_bottom_line, xs_top_line = explosion_line_x_points(chart_id) 
 
-    ax.plot(xs_bottom_line, ys_bottom_line, 
-            **exp_barch_tp_set["exploding_line"])        
-    ax.plot(xs_top_line, ys_top_line, 
-            **exp_barch_tp_set["exploding_line"])
+    geometry = ExplosionGeometry(numpy.array([chart_id], dtype=numpy.intp),
+                                 numpy.array([ys_bottom_line], dtype=float),
+                                 numpy.array([ys_top_line], dtype=float),
+                                 [emphasis])
+    style = cascade_style()
+    layout = CascadeLayout(chart_id + 2, representation,
+                           **_layout_wedges(geometry, representation, style))
+    _render_wedge(ax, layout, 0, style)
+
+
+class StackData(object):
+    """
+    Columnar data of a single stack: values, labels and colors
+    Indexing and iterating gives (value, label, color) triplets just like the
+    list input
+    """
+
+    def __init__(self, values, labels, colors):
+        self.values = values
+        self.labels = labels
+        self.colors = colors
+
+    @classmethod
+    def from_data(cls, data):
+        """
+        Adapter for a list of [value, label, #color] triplets
+        """
+        if isinstance(data, StackData):
+            return data
+        values = numpy.array([entry[0] for entry in data], dtype=float)
+        labels = numpy.empty(len(data), dtype=object)
+        labels[:] = [entry[1] for entry in data]
+        colors = numpy.empty(len(data), dtype=object)
+        colors[:] = [entry[2] for entry in data]
+        return cls(values, labels, colors)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, idx):
+        return self.values[idx], self.labels[idx], self.colors[idx]
+
+    def __iter__(self):
+        return zip(self.values, self.labels, self.colors)
+
+
+class CascadeData(object):
+    """
+    Columnar data of a whole cascade
+    values:  float array with the values of all stacks after each other
+    offsets: int array of length n_stacks + 1, stack i has the entries
+             offsets[i]:offsets[i+1]
+    labels, colors: arrays with the same length as values
+
+    Numpy (and memory mapped) arrays are used as is, without copying, when
+    values is float64 and offsets intp: other dtypes (e.g. float32) are
+    converted, which copies them
+    """
+
+    def __init__(self, values, offsets, labels, colors):
+        self.values = numpy.asarray(values, dtype=float)
+        self.offsets = numpy.asarray(offsets, dtype=numpy.intp)
+        self.labels = self._object_array(labels)
+        self.colors = self._object_array(colors)
+        self._boundaries = None
+        self._label_indices = {}
+
+        if self.values.ndim != 1 or self.offsets.ndim != 1 or \
+           len(self.offsets) < 1:
+            raise ValueError("values and offsets should be 1d arrays")
+        if self.offsets[0] != 0 or self.offsets[-1] != len(self.values) or \
+           numpy.any(numpy.diff(self.offsets) < 0):
+            raise ValueError("offsets should increase from 0 to len(values)")
+        if len(self.labels) != len(self.values) or \
+           len(self.colors) != len(self.values):
+            raise ValueError("labels and colors should have the same length "
+                             "as values")
+
+    @staticmethod
+    def _object_array(entries):
+        if isinstance(entries, numpy.ndarray):
+            return entries
+        array = numpy.empty(len(entries), dtype=object)
+        array[:] = list(entries)
+        return array
+
+    @classmethod
+    def from_data(cls, data):
+        """
+        Adapter for the list of stacks with [value, label, #color] triplets
+        """
+        if isinstance(data, CascadeData):
+            return data
+        offsets = numpy.zeros(len(data) + 1, dtype=numpy.intp)
+        offsets[1:] = numpy.cumsum([len(bar) for bar in data])
+        entries = [entry for bar in data for entry in bar]
+        return cls([entry[0] for entry in entries], offsets,
+                   [entry[1] for entry in entries],
+                   [entry[2] for entry in entries])
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def stack(self, idx):
+        """
+        Returns a StackData view on stack idx
+        """
+        begin, end = self.offsets[idx], self.offsets[idx + 1]
+        return StackData(self.values[begin:end], self.labels[begin:end],
+                         self.colors[begin:end])
+
+    def stacks(self):
+        return [self.stack(idx) for idx in range(len(self))]
+
+    def label_index(self, idx):
+        """
+        Returns the StackLabelIndex of stack idx, kept for the next lookups
+        """
+        if idx not in self._label_indices:
+            begin, end = self.offsets[idx], self.offsets[idx + 1]
+            self._label_indices[idx] = StackLabelIndex(self.labels[begin:end])
+        return self._label_indices[idx]
+
+    def stack_sums(self):
+        """
+        Returns the sum of the values of each stack
+        """
+        sums = numpy.zeros(len(self))
+        # reduceat can not handle empty stacks, these are skipped
+        filled = numpy.diff(self.offsets) > 0
+        if numpy.any(filled):
+            sums[filled] = numpy.add.reduceat(self.values,
+                                              self.offsets[:-1][filled])
+        return sums
+
+    def boundaries(self):
+        """
+        Returns the cumulative sum index of all the stacks: (bounds, starts)
+        Entry j of stack i runs from bounds[starts[i] + j] to
+        bounds[starts[i] + j + 1], the top of stack i is
+        bounds[starts[i] + len(stack i)]
+        """
+        if self._boundaries is None:
+            bounds = numpy.zeros(len(self.values) + len(self))
+            starts = self.offsets[:-1] + numpy.arange(len(self))
+            for idx in range(len(self)):
+                begin, end = self.offsets[idx], self.offsets[idx + 1]
+                numpy.cumsum(self.values[begin:end],
+                             out=bounds[starts[idx] + 1:
+                                        starts[idx] + 1 + end - begin])
+            self._boundaries = (bounds, starts)
+        return self._boundaries
+
+    def normalize(self, representation=None):
+        """
+        Returns the normalized or percentage version of the data and the total
+        bar sizes (possibly normalized) for relative bar plotting
+        The data itself is not changed, for representation None it is returned
+        A stack summing to zero (or an empty first stack, the relative bars
+        are relative to it) can not be normalized and raises ValueError
+        """
+        sums = self.stack_sums()
+        if representation is None:
+            return self, sums
+
+        zero = (sums == 0) & (numpy.diff(self.offsets) > 0)
+        if len(sums):
+            zero[0] = sums[0] == 0
+        if numpy.any(zero):
+            raise ValueError("stack %d sums to zero, it can not be %s" % (
+                numpy.flatnonzero(zero)[0], representation))
+
+        #now normalize or percentage
+        size_bar = 1.0
+        if representation == "percentage":
+            size_bar = 100.0  # %
+
+        values = self.values / numpy.repeat(sums, numpy.diff(self.offsets))
+        values *= size_bar
+        bar_sums = (sums / sums[0]) * size_bar if len(sums) else sums
+        return CascadeData(values, self.offsets, self.labels, self.colors), \
+               bar_sums
+
 
-    # Add text at the centre to show the size of the 'sum'
-        # Add the label of the bar (if there)
-    if exp_barch_tp_set["explode_label"]:
+def normalize_or_percentage_data(data, representation=None):
+    """
+    Normalization or percentage version of the input data
+    Returns the total bar size (possibly normalized) for relative bar plotting
+
+    The list of [value, label, #color] triplets is changed in place, for the
+    columnar data use CascadeData.normalize
+    """
+    normalized, bar_sums = CascadeData.from_data(data).normalize(
+        representation)
+
+    if not representation is None:
+        values = normalized.values.tolist()
+        idx = 0
+        for bar in data:
+            for entry in bar:
+                entry[0] = values[idx]
+                idx += 1
+
+    return bar_sums.tolist()
+
+def _text_array(texts):
+    """
+    Helper function converting labels to a numpy str array, None is empty
+    """
+    return numpy.array(["" if text is None else str(text) for text in texts],
+                       dtype=str)
+
+
+class CascadeLayout(object):
+    """
+    The computed layout of a cascade: plain data (numpy arrays in data
+    coordinates), independent of the Axes it is drawn on. Compute it once with
+    cascade_layout and draw it (repeatedly) with render_cascade_layout. Can be
+    saved to json (to_json) or numpy .npz (save_npz) and loaded again.
+
+    Each component is a dict of arrays with one entry per element:
+    boxes:          x, bottom, width, height, facecolor, edgecolor (rgba),
+                    emphasis, stack, label
+    box_labels:     x, y, text, stack   (only the labels that fit their box)
+    bar_labels:     x, y, text, stack
+    relative_bars:  x, height, width, stack
+    explode_lines:  xs (n, 2), ys_bottom (n, 2), ys_top (n, 2), stack
+                    one entry per wedge, stack is the left stack of the wedge
+    explode_labels: x, y, text, wedge
+    explode_bgs:    verts (n, 4, 2), wedge
+    All components are ordered on stack (or wedge).
+
+    dpi is the dpi used to check which box labels fit.
+    """
+
+    fields = {
+        "boxes": (("x", float, ()), ("bottom", float, ()),
+                  ("width", float, ()), ("height", float, ()),
+                  ("facecolor", float, (4,)), ("edgecolor", float, (4,)),
+                  ("emphasis", bool, ()), ("stack", numpy.intp, ()),
+                  ("label", str, ())),
+        "box_labels": (("x", float, ()), ("y", float, ()), ("text", str, ()),
+                       ("stack", numpy.intp, ())),
+        "bar_labels": (("x", float, ()), ("y", float, ()), ("text", str, ()),
+                       ("stack", numpy.intp, ())),
+        "relative_bars": (("x", float, ()), ("height", float, ()),
+                          ("width", float, ()), ("stack", numpy.intp, ())),
+        "explode_lines": (("xs", float, (2,)), ("ys_bottom", float, (2,)),
+                          ("ys_top", float, (2,)), ("stack", numpy.intp, ())),
+        "explode_labels": (("x", float, ()), ("y", float, ()),
+                           ("text", str, ()), ("wedge", numpy.intp, ())),
+        "explode_bgs": (("verts", float, (4, 2)), ("wedge", numpy.intp, ())),
+    }
+
+    def __init__(self, n_stacks, representation=None, dpi=None,
+                 **components):
+        self.n_stacks = int(n_stacks)
+        self.representation = representation
+        self.dpi = dpi
+        for name, fields in self.fields.items():
+            arrays = components.get(name) or {}
+            component = {}
+            for field, dtype, shape in fields:
+                if field in arrays:
+                    array = numpy.asarray(arrays[field], dtype=dtype)
+                    component[field] = array.reshape((-1,) + shape)
+                else:
+                    component[field] = numpy.zeros((0,) + shape, dtype=dtype)
+            setattr(self, name, component)
+
+    def components(self):
+        return dict((name, getattr(self, name)) for name in self.fields)
+
+    def indices(self, component, key):
+        """
+        Returns the range of the entries of component belonging to key, a
+        stack (or for the explode labels and backgrounds a wedge) index
+        """
+        arrays = getattr(self, component)
+        field = "wedge" if "wedge" in arrays else "stack"
+        begin, end = numpy.searchsorted(arrays[field], [key, key + 1])
+        return range(begin, end)
+
+    def subset(self, stacks, wedge_stacks=None):
+        """
+        Returns the layout with only the elements of stacks (a list of stack
+        indices) and the wedges starting at wedge_stacks (default: stacks).
+        The stack indices (and so the x locations) are kept, the wedges are
+        renumbered.
+        """
+        stacks = numpy.asarray(stacks, dtype=numpy.intp)
+        if wedge_stacks is None:
+            wedge_stacks = stacks
+        wedges = numpy.flatnonzero(numpy.isin(self.explode_lines["stack"],
+                                              wedge_stacks))
+        components = {}
+        for name, arrays in self.components().items():
+            if "wedge" in arrays:
+                selected = numpy.isin(arrays["wedge"], wedges)
+            else:
+                selected = numpy.isin(arrays["stack"], stacks)
+            component = dict((field, array[selected])
+                             for field, array in arrays.items())
+            if "wedge" in component:
+                component["wedge"] = numpy.searchsorted(wedges,
+                                                        component["wedge"])
+            components[name] = component
+        return CascadeLayout(self.n_stacks, self.representation, self.dpi,
+                             **components)
+
+    def bounds(self):
+        """
+        Returns ((xmin, ymin), (xmax, ymax)) of the boxes, relative bars and
+        wedges, the data limits of the drawn chart
+        """
+        boxes = self.boxes
+        relative = self.relative_bars
+        lines = self.explode_lines
+        xs = [boxes["x"], boxes["x"] + boxes["width"], relative["x"],
+              relative["x"] + relative["width"], lines["xs"].ravel()]
+        ys = [boxes["bottom"], boxes["bottom"] + boxes["height"],
+              numpy.zeros(len(relative["x"])), relative["height"],
+              lines["ys_bottom"].ravel(), lines["ys_top"].ravel()]
+        xs = numpy.concatenate(xs)
+        ys = numpy.concatenate(ys)
+        if not len(xs):
+            return None
+        return (xs.min(), ys.min()), (xs.max(), ys.max())
+
+    def to_dict(self):
+        """
+        Returns the layout as dict with (nested) lists, can be dumped to json
+        """
+        layout = {"n_stacks": self.n_stacks,
+                  "representation": self.representation, "dpi": self.dpi}
+        for name, component in self.components().items():
+            layout[name] = dict((field, array.tolist())
+                                for field, array in component.items())
+        return layout
+
+    @classmethod
+    def from_dict(cls, layout):
+        components = dict((name, layout[name]) for name in cls.fields
+                          if name in layout)
+        return cls(layout["n_stacks"], layout.get("representation"),
+                   layout.get("dpi"), **components)
+
+    def to_json(self, fp=None):
+        """
+        Returns the layout as json string, or writes it to the file object fp
+        """
+        if fp is None:
+            return json.dumps(self.to_dict())
+        json.dump(self.to_dict(), fp)
+
+    @classmethod
+    def from_json(cls, layout):
+        """
+        Load from a json string or file object
+        """
+        if hasattr(layout, "read"):
+            return cls.from_dict(json.load(layout))
+        return cls.from_dict(json.loads(layout))
+
+    def save_npz(self, file):
+        """
+        Save the layout as compressed numpy .npz (file name or object)
+        """
+        arrays = {"meta": numpy.array(json.dumps({
+            "n_stacks": self.n_stacks, "representation": self.representation,
+            "dpi": self.dpi}))}
+        for name, component in self.components().items():
+            for field, array in component.items():
+                arrays[name + "." + field] = array
+        numpy.savez_compressed(file, **arrays)
+
+    @classmethod
+    def load_npz(cls, file):
+        with numpy.load(file) as arrays:
+            meta = json.loads(str(arrays["meta"]))
+            components = {}
+            for key in arrays.files:
+                if key == "meta":
+                    continue
+                name, field = key.split(".", 1)
+                components.setdefault(name, {})[field] = arrays[key]
+        return cls(meta["n_stacks"], meta["representation"], meta["dpi"],
+                   **components)
+
+
+def _emphasis_mask(cascade, emphasis):
+    """
+    Helper function returning a boolean mask over all the boxes of the
+    cascade with the emphasized boxes
+    """
+    sizes = numpy.diff(cascade.offsets)
+    # If we have data in the emphasis array get the ranges
+    # We can have multiple ranges, mark all the emphasis boxes
+    emphasized = numpy.zeros(len(cascade.values), dtype=bool)
+    for stack_idx in range(len(cascade)):
+        for emph_entry in _stack_emphasis(emphasis, stack_idx):
+            # range of the bounds is the inclusive range of the boxes
+            begin, end = _range_bound_indices(emph_entry[0], sizes[stack_idx],
+                                              cascade.label_index(stack_idx))
+            emphasized[cascade.offsets[stack_idx] + begin:
+                       cascade.offsets[stack_idx] + end] = True
+    return emphasized
+
+
+def _target_breaks(cascade, emphasis):
+    """
+    Helper function returning a boolean mask over all the boxes of the
+    cascade with the boxes the explosion lines from the previous stack end
+    on: the first box of each target range and the box above it
+    """
+    sizes = numpy.diff(cascade.offsets)
+    breaks = numpy.zeros(len(cascade.values), dtype=bool)
+    for stack_idx in range(1, len(cascade)):
+        for emph_entry in _stack_emphasis(emphasis, stack_idx - 1):
+            begin, end = _range_bound_indices(emph_entry[1], sizes[stack_idx],
+                                              cascade.label_index(stack_idx))
+            for bound in (begin, end):
+                if bound < sizes[stack_idx]:
+                    breaks[cascade.offsets[stack_idx] + bound] = True
+    return breaks
+
+
+def lod_merge(cascade, threshold, keep=None, style=None, breaks=None):
+    """
+    Level of detail: merge the boxes smaller than threshold (in data units)
+    into a single "other" box per run of neighbouring small boxes in a stack.
+    Boxes in the keep mask are never merged, a single small box is kept as is.
+    Boxes in the breaks mask always start a new run (the bounds below them
+    stay exact).
+    The label and color of the merged boxes are the typesetting entries
+    lod_label and lod_color.
+
+    Returns the merged CascadeData and the index of the first original box of
+    each merged box (use it to select from masks over the original boxes)
+    """
+    values = cascade.values
+    small = values < threshold
+    if keep is not None:
+        small &= ~keep
+    stack_start = numpy.zeros(len(values), dtype=bool)
+    stack_start[cascade.offsets[:-1][numpy.diff(cascade.offsets) > 0]] = True
+
+    # A box starts a new merged box unless it continues a run of small boxes
+    continues_run = small.copy()
+    continues_run[1:] &= small[:-1]
+    continues_run[0] = False
+    if breaks is not None:
+        continues_run &= ~breaks
+    group_starts = numpy.flatnonzero(~continues_run | stack_start)
+    if len(group_starts) == len(values):
+        return cascade, group_starts
+
+    group_sizes = numpy.diff(numpy.append(group_starts, len(values)))
+    merged = group_sizes > 1
+    labels = cascade.labels[group_starts]
+    colors = cascade.colors[group_starts]
+    style = cascade_style(style)
+    labels[merged] = style["lod_label"]
+    colors[merged] = style["lod_color"]
+    offsets = numpy.searchsorted(group_starts, cascade.offsets)
+    return CascadeData(numpy.add.reduceat(values, group_starts), offsets,
+                       labels, colors), group_starts
+
+
+def lod_threshold(ax, top, pixels=1.0):
+    """
+    The height in data units of pixels on ax, for a chart with top as the
+    highest y value. When the y-axis autoscales the 0 to top range with the
+    y margin is assumed, otherwise the current y limits are used.
+    """
+    height = ax.get_window_extent().height
+    if ax.get_autoscaley_on():
+        if numpy.isfinite(ax.dataLim.y1):
+            top = max(top, ax.dataLim.y1)
+        span = top * (1. + ax.margins()[1])
+    else:
+        ymin, ymax = ax.get_ylim()
+        span = abs(ymax - ymin)
+    if height <= 0 or span <= 0:
+        return 0.
+    return pixels * span / height
+
+
+def _layout_stacks(cascade, bar_sums, emphasized, bar_labels, dpi, style,
+                   first_stack=0, instrument=None):
+    """
+    Helper function computing the boxes, box labels, bar labels and relative
+    bars of all stacks of the (normalized) cascade. The stacks are placed at
+    x = first_stack, first_stack + 1, ...
+    emphasized is the mask of emphasis boxes (see _emphasis_mask)
+    Returns a dict with the components for CascadeLayout
+    """
+    n_stacks = len(cascade)
+    sizes = numpy.diff(cascade.offsets)
+    stack = numpy.repeat(numpy.arange(n_stacks), sizes)
+    bounds, starts = cascade.boundaries()
+    # starts[stack] + index in stack == index in values + stack
+    bottom = bounds[numpy.arange(len(cascade.values)) + stack]
+    x = (stack + first_stack).astype(float)
+
+    labels = _text_array(cascade.labels)
+    components = {"boxes": {
+        "x": x, "bottom": bottom, "height": cascade.values,
+        "width": numpy.where(emphasized, style.box_width[True],
+                             style.box_width[False]),
+        # Resolve all the colors in one go
+        "facecolor": color_cache.rgba(cascade.colors),
+        "edgecolor": color_cache.shaded_rgba(
+            cascade.colors, style["box_border_gradient"]),
+        "emphasis": emphasized, "stack": stack, "label": labels}}
+
+    if style["box_label"]:
+        # Check in one go which labels fit in their box, labels that are
+        # larger then some user controlled size are never created
+        with _span(instrument, "label_fit") as span:
+            text_heights = text_metrics.heights(
+                labels, style["box_label_text"], dpi)
+            box_size_text_cutoff = style["box_size_text_cutoff"]
+            fits = (text_heights * box_size_text_cutoff) <= cascade.values
+            span.set("labels", len(labels))
+            span.set("labels_removed", len(labels) - int(numpy.sum(fits)))
+        components["box_labels"] = {
+            "x": x[fits] + style["box_label_offset"],
+            "y": bottom[fits] + 0.5 * cascade.values[fits],
+            "text": labels[fits], "stack": stack[fits]}
+
+    # Add the label of the bar (if there)
+    if style["bar_label"]:
+        with_label = [idx for idx in range(n_stacks) if bar_labels[idx]]
+        with_label = numpy.array(with_label, dtype=numpy.intp)
+        components["bar_labels"] = {
+            "x": with_label + first_stack + style["bar_label_offset"],
+            "y": bounds[starts[with_label] + sizes[with_label]],
+            "text": _text_array([bar_labels[idx] for idx in with_label]),
+            "stack": with_label}
+
+    # Add the relative size bar
+    if style["relative"]:
+        components["relative_bars"] = {
+            "x": numpy.arange(n_stacks) + first_stack +
+                 style["relative_box_h_offset"],
+            "height": numpy.array(bar_sums, dtype=float),
+            "width": numpy.full(n_stacks, style.relative_box_width),
+            "stack": numpy.arange(n_stacks)}
+
+    return components
+
+
+def _layout_wedges(geometry, representation, style):
+    """
+    Helper function computing the explosion lines, labels and shaded
+    backgrounds of all the wedges in the ExplosionGeometry
+    Returns a dict with the components for CascadeLayout
+    """
+    xs = numpy.column_stack(explosion_line_x_points(geometry.chart_ids)[0])
+    ys_bottom = geometry.ys_bottom
+    ys_top = geometry.ys_top
+    components = {"explode_lines": {
+        "xs": xs, "ys_bottom": ys_bottom, "ys_top": ys_top,
+        "stack": geometry.chart_ids}}
+
+    if style["explode_label"]:
         # The vertical location of the label might be a little offset if the 
         # wedge has a large vertical shift to the next bar
         # Use the explode_label_offset combined with the ys_top_line and bottom
         # line to create an interpolation location which is better
-        mid_left = (ys_top_line[0] + ys_bottom_line[0]) / 2
-        mid_right = (ys_top_line[1] + ys_bottom_line[1]) / 2
+        mid_left = (ys_top[:, 0] + ys_bottom[:, 0]) / 2
+        mid_right = (ys_top[:, 1] + ys_bottom[:, 1]) / 2
         # Calculate side and direction of shift between bards
         midline_dx = mid_right - mid_left
 
         # left side of 
-        left_cor = exp_barch_tp_set["explode_label_v_offset_left"]
-        left_offset = exp_barch_tp_set["explode_label_offset_left"] 
+        left_cor = style["explode_label_v_offset_left"]
+        left_offset = style["explode_label_offset_left"] 
         # Calculate some fraction based on the offset and the width
         fraction_away_from_left = left_offset / .50
         # magnitude correction * fraction times the dx = correction
         correction_left = left_cor * fraction_away_from_left * midline_dx
-        if not emphasis[0][2] is None:
-            ax.text(chart_id + exp_barch_tp_set["explode_label_offset_left"], 
-                mid_left + correction_left, 
-                emphasis[0][2],
-                  **exp_barch_tp_set["explode_label_text"])
-
 
         # Detail explanantion can be found in left side of correctopm
-        right_cor = exp_barch_tp_set["explode_label_v_offset_right"]
-        right_offset = exp_barch_tp_set["explode_label_offset_right"] 
+        right_cor = style["explode_label_v_offset_right"]
+        right_offset = style["explode_label_offset_right"] 
         fraction_away_from_right = (1 - right_offset ) / .50  
         correction_right = - right_cor * fraction_away_from_right * midline_dx
-        if not emphasis[1][2] is None:
-            ax.text(chart_id + exp_barch_tp_set["explode_label_offset_right"], 
-                mid_right  + correction_right, 
-                emphasis[1][2],
-                  **exp_barch_tp_set["explode_label_text"])
-    
+
+        # Left and right label of each wedge after each other
+        x = numpy.column_stack((geometry.chart_ids + left_offset,
+                                geometry.chart_ids + right_offset)).ravel()
+        y = numpy.column_stack((mid_left + correction_left,
+                                mid_right + correction_right)).ravel()
+        texts = [label for pair in zip(geometry.labels(0), geometry.labels(1))
+                 for label in pair]
+        has_text = numpy.array([text is not None for text in texts],
+                               dtype=bool)
+        components["explode_labels"] = {
+            "x": x[has_text], "y": y[has_text],
+            "text": _text_array(text for text in texts if text is not None),
+            "wedge": numpy.repeat(numpy.arange(len(geometry)), 2)[has_text]}
+
     # Draw a gray background between the explosion lines
-    if exp_barch_tp_set["explode_bg"]:
-        # If we are doing work in percentage its easier to have the y_offset be corrected
-        if representation == "percentage":
-            offset_correct = 100.
-        else:
-            offset_correct = 1.
+    if style["explode_bg"]:
         # There are some small plotting issues, depending on the representation and size 
-        # of the window, these can be corrected here
-        xs_offset = exp_barch_tp_set["explode_bg_xs_offset"] #0.009
-        ys_offset = offset_correct * exp_barch_tp_set["explode_bg_ys_offset"] #0.02
+        # of the window, these can be corrected here (in percentage the
+        # y_offset is corrected)
+        xs_offset = style["explode_bg_xs_offset"] #0.009
+        ys_offset = style.explode_bg_ys_offset(representation) #0.02
         # Convert the locations we have to verts
-        verts = [
-            (xs_bottom_line[0] + xs_offset, ys_bottom_line[0] + ys_offset), # left, bottom
-            (xs_top_line[0] + xs_offset, ys_top_line[0]), # left, top
-            (xs_top_line[1] + xs_offset, ys_top_line[1]), # right, top
-            (xs_bottom_line[1] + xs_offset, ys_bottom_line[1] + ys_offset), # right, bottom
-            (xs_bottom_line[0]+ xs_offset, ys_bottom_line[0] + ys_offset), # ignored
-            ]
-        # plot the patch
-        codes = [Path.MOVETO, Path.LINETO, Path.LINETO, Path.LINETO, Path.CLOSEPOLY]
-        path = Path(verts, codes)    
-        patch = patches.PathPatch(path, **exp_barch_tp_set["explode_bg_vert"]) #facecolor='orange', lw=0, zorder=1
-        ax.add_patch(patch)
-      
-def normalize_or_percentage_data(data, representation=None):
+        verts = numpy.stack([
+            numpy.column_stack((xs[:, 0], ys_bottom[:, 0] + ys_offset)), # left, bottom
+            numpy.column_stack((xs[:, 0], ys_top[:, 0])), # left, top
+            numpy.column_stack((xs[:, 1], ys_top[:, 1])), # right, top
+            numpy.column_stack((xs[:, 1], ys_bottom[:, 1] + ys_offset)), # right, bottom
+            ], axis=1)
+        verts[:, :, 0] += xs_offset
+        components["explode_bgs"] = {"verts": verts,
+                                     "wedge": numpy.arange(len(geometry))}
+
+    return components
+
+
+def cascade_layout(data, emphasis, bar_labels, representation=None,
+                   dpi=None, lod_threshold=None, instrument=None,
+                   style=None):
     """
-    Normalization or percentage version of the input data
-    Returns the total bar size (possibly normalized) for relative bar plotting
+    Compute the layout of a cascaded exploding barchart without drawing it
+    The arguments are the same as for cascaded_exploding_barcharts, dpi is
+    used to check if the box labels fit (default: rcParams["figure.dpi"])
+    lod_threshold: merge boxes smaller than this height (in the units of the
+    representation) see lod_merge, the emphasized boxes and the bounds the
+    explosion lines end on are kept exact.
+    instrument: receives the timed phases, see cascaded_exploding_barcharts
+    style: CascadeStyle or dict of typesetting (default exp_barch_tp_set),
+    render the layout with the same style
+
+    Returns a CascadeLayout, draw it with render_cascade_layout
     """
-    
-    bar_sums = []
-    first_bar_sum = None
-    for bar in data:
-        #Calculate the sum (also needed for the relative bar length)
-        sum = 0.
-        for entry in bar:
-            sum += entry[0]
-
-        # If we are processing the first bar
-        if first_bar_sum is None:
-            first_bar_sum = sum
-
-        if not representation is None:
-            #now normalize or percentage
-            size_bar = 1.0
-            if representation == "percentage":
-                size_bar = 100.0  # %
-
-            norm_sum = None
-            for entry in bar:
-                    norm_sum = (entry[0] / sum ) * size_bar
-                    entry[0] = norm_sum
+    style = cascade_style(style)
+    with _span(instrument, "layout"):
+        return _cascade_layout(data, emphasis, bar_labels, representation,
+                               dpi, lod_threshold, instrument, style)
+
+
+def _cascade_layout(data, emphasis, bar_labels, representation, dpi,
+                    lod_threshold, instrument, style):
+    if dpi is None:
+        from matplotlib import rcParams
+        dpi = rcParams["figure.dpi"]
+    # Columnar version of the data, normalization creates new arrays and
+    # leaves the data of the caller untouched
+    with _span(instrument, "normalize") as span:
+        cascade, bar_sums = CascadeData.from_data(data).normalize(
+            representation)
+        emphasized = _emphasis_mask(cascade, emphasis)
+        span.set("boxes", len(cascade.values))
+
+    # The explosion lines of all wedges in one go, on the exact data
+    with _span(instrument, "explosion_geometry") as span:
+        geometry = explosion_geometry(cascade, emphasis)
+        components = _layout_wedges(geometry, representation, style)
+        span.set("wedges", len(geometry))
+
+    if lod_threshold:
+        with _span(instrument, "lod_merge") as span:
+            # The explosion lines end on the bounds of the target ranges,
+            # the runs are broken there to keep these bounds exact
+            breaks = _target_breaks(cascade, emphasis)
+            span.set("boxes", len(cascade.values))
+            cascade, first_boxes = lod_merge(cascade, lod_threshold,
+                                             emphasized, style, breaks)
+            emphasized = emphasized[first_boxes]
+            span.set("merged_boxes", len(cascade.values))
+
+    with _span(instrument, "layout_stacks"):
+        components.update(_layout_stacks(cascade, bar_sums, emphasized,
+                                         bar_labels, dpi, style,
+                                         instrument=instrument))
+    return CascadeLayout(len(cascade), representation, dpi, **components)
+
+
+def _without_width(settings):
+    return dict((key, value) for key, value in settings.items()
+                if key != "width")
+
+
+# The typesetting of the text components of the layout
+_text_settings = {"box_labels": "box_label_text",
+                  "bar_labels": "bar_label_text",
+                  "explode_labels": "explode_label_text"}
+
+
+def _render_box(ax, layout, idx, style):
+    """
+    Helper function drawing a single box with ax.bar, returns the BarContainer
+    """
+    boxes = layout.boxes
+    return ax.bar(boxes["x"][idx], boxes["height"][idx],
+                  width=boxes["width"][idx], bottom=boxes["bottom"][idx],
+                  color=boxes["facecolor"][idx], align='edge',
+                  edgecolor=boxes["edgecolor"][idx], label=boxes["label"][idx],
+                  **style.box_kwargs[bool(boxes["emphasis"][idx])])
+
+
+def _box_verts(boxes, selected):
+    left = boxes["x"][selected]
+    right = left + boxes["width"][selected]
+    bottom = boxes["bottom"][selected]
+    top = bottom + boxes["height"][selected]
+    return numpy.stack([numpy.column_stack((left, bottom)),
+                        numpy.column_stack((left, top)),
+                        numpy.column_stack((right, top)),
+                        numpy.column_stack((right, bottom))], axis=1)
+
+
+def _render_box_collections(ax, layout, indices, style, collections=None,
+                            stack_idx=None):
+    """
+    Helper function drawing boxes as one PolyCollection for the normal and
+    one for the emphasis boxes (the box settings are used for the collection)
+    The collections are stored in the collections dict with key
+    (stack_idx, emphasis), existing collections are updated in place
+    """
+    from matplotlib.collections import PolyCollection
+
+    if collections is None:
+        collections = {}
+    boxes = layout.boxes
+    indices = numpy.arange(len(boxes["x"]))[indices]
+    for emphasis in (False, True):
+        key = (stack_idx, emphasis)
+        selected = indices[boxes["emphasis"][indices] == emphasis]
+        if not len(selected):
+            if key in collections:
+                collections.pop(key).remove()
+            continue
+
+        verts = _box_verts(boxes, selected)
+        if key in collections:
+            collection = collections[key]
+            collection.set_verts(verts)
+            collection.set_facecolor(boxes["facecolor"][selected])
+            collection.set_edgecolor(boxes["edgecolor"][selected])
+            continue
+
+        collection = PolyCollection(
+            verts, facecolors=boxes["facecolor"][selected],
+            edgecolors=boxes["edgecolor"][selected],
+            **style.box_kwargs[emphasis])
+        # Same as ax.bar: do not add a margin below the bottom of the bars
+        collection.sticky_edges.y.append(0)
+        ax.add_collection(collection)
+        collections[key] = collection
+
+    ax.autoscale_view()
+    return collections
+
+
+def _legend_handles(layout, style):
+    """
+    Helper function creating legend proxies for the boxes in the layout,
+    for boxes that are drawn as collections
+    """
+    import matplotlib.patches as patches
+
+    boxes = layout.boxes
+    handles = []
+    for idx in range(len(boxes["x"])):
+        handles.append(patches.Patch(
+            facecolor=boxes["facecolor"][idx],
+            edgecolor=boxes["edgecolor"][idx], label=boxes["label"][idx],
+            **style.box_kwargs[bool(boxes["emphasis"][idx])]))
+    return handles
 
-            bar_sums.append((sum / first_bar_sum) * size_bar )
+
+def _render_text(ax, layout, component, idx, style):
+    labels = getattr(layout, component)
+    return ax.text(labels["x"][idx], labels["y"][idx], labels["text"][idx],
+                   **style[_text_settings[component]])
+
+
+def _render_relative_bar(ax, layout, idx, style):
+    relative = layout.relative_bars
+    return ax.bar(relative["x"][idx], relative["height"][idx],
+                  width=relative["width"][idx], bottom=0, color='k',
+                  align='edge',
+                  **style.relative_box_kwargs)
+
+
+def _render_explode_lines(ax, layout, wedge_idx, style):
+    lines = layout.explode_lines
+    line_bottom, = ax.plot(lines["xs"][wedge_idx], lines["ys_bottom"][wedge_idx],
+            **style["exploding_line"])        
+    line_top, = ax.plot(lines["xs"][wedge_idx], lines["ys_top"][wedge_idx],
+            **style["exploding_line"])
+    return line_bottom, line_top
+
+
+def _explode_bg_path(verts):
+    from matplotlib.path import Path
+
+    # close the polygon
+    verts = numpy.concatenate((verts, verts[:1]))
+    codes = [Path.MOVETO, Path.LINETO, Path.LINETO, Path.LINETO, Path.CLOSEPOLY]
+    return Path(verts, codes)    
+
+
+def _render_explode_bg(ax, layout, idx, style):
+    import matplotlib.patches as patches
+
+    path = _explode_bg_path(layout.explode_bgs["verts"][idx])
+    patch = patches.PathPatch(path, **style["explode_bg_vert"]) #facecolor='orange', lw=0, zorder=1
+    ax.add_patch(patch)
+    return patch
+
+
+# The text settings that can be drawn as text paths in a collection
+_text_path_keys = set(["ha", "horizontalalignment", "va", "verticalalignment",
+                       "fontsize", "size", "style", "fontstyle", "weight",
+                       "fontweight", "family", "fontfamily", "variant",
+                       "fontvariant", "stretch", "fontstretch", "font",
+                       "fontproperties", "font_properties", "color", "c",
+                       "alpha", "zorder"])
+
+
+def _text_paths(texts, text_kwargs):
+    """
+    Helper function converting single line labels to TextPaths (in points)
+    aligned as ax.text would with text_kwargs. Returns None when the labels
+    or the settings are not supported (multi line, rotation, bbox, tex, ...)
+    """
+    from matplotlib import rcParams
+    from matplotlib.textpath import TextPath
+
+    if not set(text_kwargs) <= _text_path_keys or rcParams["text.usetex"]:
+        return None
+    ha = text_kwargs.get("ha", text_kwargs.get("horizontalalignment", "left"))
+    va = text_kwargs.get("va", text_kwargs.get("verticalalignment",
+                                                "baseline"))
+    if ha not in ("left", "center", "right") or \
+       va not in ("baseline", "bottom", "center", "top"):
+        return None
+    if any("\n" in str(text) for text in texts):
+        return None
+
+    prop = text_font_properties(text_kwargs)
+    # Lines are at least as high as "lp", as for Text
+    _, lp_height, lp_descent = text_metrics.line_metrics("lp", prop, 72)
+    paths = {}
+    for text in texts:
+        text = str(text)
+        if text in paths:
+            continue
+        width, height, descent = text_metrics.line_metrics(text, prop, 72)
+        height = max(height, lp_height)
+        descent = max(descent, lp_descent)
+        dx = {"left": 0., "center": -width / 2, "right": -width}[ha]
+        dy = {"baseline": 0., "bottom": descent,
+              "center": descent - height / 2, "top": descent - height}[va]
+        paths[text] = TextPath((dx, dy), text, prop=prop)
+    return [paths[str(text)] for text in texts]
+
+
+def _render_wedge_collections(ax, layout, collections, style):
+    """
+    Helper function drawing all the explosion lines as one LineCollection,
+    all the backgrounds as one PolyCollection and the explode labels as one
+    collection of text paths. The collections are stored in the collections
+    dict keyed on the component, existing collections are updated in place.
+    Returns False when the explode labels can not be drawn as text paths
+    (see _text_paths) and have to be drawn as texts
+    """
+    from matplotlib import rcParams
+    from matplotlib.collections import PolyCollection, LineCollection, \
+        PathCollection
+    from matplotlib.transforms import Affine2D
+
+    lines = layout.explode_lines
+    segments = numpy.concatenate((
+        numpy.stack((lines["xs"], lines["ys_bottom"]), axis=2),
+        numpy.stack((lines["xs"], lines["ys_top"]), axis=2)),
+        axis=1).reshape(-1, 2, 2)
+    bgs = layout.explode_bgs
+    labels = layout.explode_labels
+    settings = style["explode_label_text"]
+    paths = _text_paths(labels["text"], settings)
+    offsets = numpy.column_stack((labels["x"], labels["y"]))
+
+    def create(component):
+        if component == "explode_lines":
+            return LineCollection(segments, **style["exploding_line"])
+        if component == "explode_bgs":
+            return PolyCollection(bgs["verts"], **style["explode_bg_vert"])
+        # Text paths in points at the label positions, like ax.text
+        kwargs = dict((key, value) for key, value in settings.items()
+                      if key in ("alpha", "zorder"))
+        kwargs.setdefault("zorder", 3)
+        return PathCollection(
+            paths, offsets=offsets, offset_transform=ax.transData,
+            transform=Affine2D().scale(1 / 72.) + ax.figure.dpi_scale_trans,
+            facecolors=settings.get("color", settings.get(
+                "c", rcParams["text.color"])),
+            edgecolors="none", linewidths=0, clip_on=False, **kwargs)
+
+    def update(component, collection):
+        if component == "explode_lines":
+            collection.set_segments(segments)
+        elif component == "explode_bgs":
+            collection.set_verts(bgs["verts"])
+        else:
+            collection.set_paths(paths)
+            collection.set_offsets(offsets)
+
+    sizes = {"explode_lines": len(segments), "explode_bgs": len(bgs["verts"]),
+             "explode_labels": len(offsets) if paths is not None else 0}
+    for component, size in sizes.items():
+        if not size:
+            if component in collections:
+                collections.pop(component).remove()
+        elif component in collections:
+            update(component, collections[component])
+        else:
+            collections[component] = create(component)
+            ax.add_collection(collections[component],
+                              autolim=component != "explode_labels")
+
+    ax.autoscale_view()
+    return paths is not None
+
+
+def _render_wedge(ax, layout, wedge_idx, style, artists=None):
+    """
+    Helper function drawing the explosion lines, labels and background of a
+    single wedge. The artists are appended to the CascadeArtists
+    """
+    lines = _render_explode_lines(ax, layout, wedge_idx, style)
+    labels = [_render_text(ax, layout, "explode_labels", idx, style)
+              for idx in layout.indices("explode_labels", wedge_idx)]
+    bgs = [_render_explode_bg(ax, layout, idx, style)
+           for idx in layout.indices("explode_bgs", wedge_idx)]
+    if artists is not None:
+        artists.artists["explode_lines"].append(lines)
+        artists.artists["explode_labels"].extend(labels)
+        artists.artists["explode_bgs"].extend(bgs)
+
+
+class CascadeArtists(object):
+    """
+    Handle on a drawn cascade as returned by cascaded_exploding_barcharts and
+    render_cascade_layout. It keeps the layout and the artists, update()
+    changes the existing artists in place instead of redrawing the chart.
+
+    artists: dict with a list of artists for each component of the layout, in
+             the same order as the layout. boxes and relative_bars contain the
+             BarContainers, explode_lines (bottom, top) Line2D pairs
+    box_collections: the box PolyCollections when batching, keyed on
+             (stack index or None, emphasis)
+    wedge_collections: when batching, the collections of all the wedges keyed
+             on the component: explode_lines (a LineCollection with the
+             bottom and top line of each wedge), explode_bgs (PolyCollection)
+             and explode_labels (PathCollection). Per wedge styling can be
+             done on these, e.g. set_color with a color per line.
+    legend_handles: handles of the boxes for ax.legend(handles=...)
+    style: the CascadeStyle of the chart, also used by update()
+    rasterize: when True the bulk geometry is rasterized in vector output,
+             see set_rasterize
+    """
+
+    def __init__(self, ax, layout, batch=None, emphasis=None,
+                 bar_labels=None, lod=None, instrument=None, style=None):
+        self.rasterize = False
+        self.ax = ax
+        self.layout = layout
+        self.batch = batch
+        self.emphasis = emphasis
+        self.bar_labels = bar_labels
+        self.lod = lod
+        self.instrument = instrument
+        self.style = cascade_style(style)
+        self.artists = dict((name, []) for name in CascadeLayout.fields)
+        self.box_collections = {}
+        self.wedge_collections = {}
+
+    @property
+    def legend_handles(self):
+        if self.batch is None:
+            return [container.patches[0]
+                    for container in self.artists["boxes"]]
+        return _legend_handles(self.layout, self.style)
+
+    def set_rasterize(self, rasterize=True):
+        """
+        Mixed raster/vector output: rasterize the bulk geometry (the normal
+        boxes, the relative bars and the wedge backgrounds) when saving to
+        svg or pdf, at the dpi given to savefig. The labels, the explosion
+        lines and the emphasized boxes stay vector. Kept on update().
+        """
+        self.rasterize = rasterize
+        boxes = self.layout.boxes
+        for idx, container in enumerate(self.artists["boxes"]):
+            container.patches[0].set_rasterized(
+                rasterize and not boxes["emphasis"][idx])
+        for (_, emphasis), collection in self.box_collections.items():
+            collection.set_rasterized(rasterize and not emphasis)
+        for container in self.artists["relative_bars"]:
+            container.patches[0].set_rasterized(rasterize)
+        bgs = list(self.artists["explode_bgs"])
+        if "explode_bgs" in self.wedge_collections:
+            bgs.append(self.wedge_collections["explode_bgs"])
+        for bg in bgs:
+            bg.set_rasterized(rasterize)
+
+    def remove(self):
+        """
+        Remove all the artists of the chart from the Axes
+        """
+        for component, artists in self.artists.items():
+            for artist in artists:
+                if component == "explode_lines":
+                    for line in artist:
+                        line.remove()
+                else:
+                    artist.remove()
+            del artists[:]
+        for collections in (self.box_collections, self.wedge_collections):
+            for collection in collections.values():
+                collection.remove()
+            collections.clear()
+
+    def count(self):
+        """
+        Returns the number of artists of the chart
+        """
+        return sum(len(artists) for artists in self.artists.values()) + \
+               len(self.artists["explode_lines"]) + \
+               len(self.box_collections) + len(self.wedge_collections)
+
+    def artist_list(self):
+        """
+        Returns a flat list of the drawn matplotlib artists of the chart (the
+        Rectangles of the BarContainers), e.g. to return from an animation
+        function with blitting
+        """
+        flat = []
+        for component, artists in self.artists.items():
+            for artist in artists:
+                if component in ("boxes", "relative_bars"):
+                    flat.extend(artist.patches)
+                elif component == "explode_lines":
+                    flat.extend(artist)
+                else:
+                    flat.append(artist)
+        flat.extend(self.box_collections.values())
+        flat.extend(self.wedge_collections.values())
+        return flat
+
+    def update(self, data, emphasis=None, bar_labels=None):
+        """
+        Update the chart with new data. emphasis and bar_labels are kept when
+        None. Only the changed artists are touched, artists are created or
+        removed when the number of elements changes.
+        """
+        if emphasis is None:
+            emphasis = self.emphasis
+        if bar_labels is None:
+            bar_labels = self.bar_labels
+        layout = _axes_cascade_layout(self.ax, data, emphasis, bar_labels,
+                                      self.layout.representation, self.lod,
+                                      self.instrument, self.style)
+        self.emphasis = emphasis
+        self.bar_labels = bar_labels
+        with _span(self.instrument, "update") as span:
+            count = _span_count(span, self)
+            self.set_layout(layout)
+            span.set("artists", _span_count(span, self) - count)
+
+    def set_layout(self, layout):
+        """
+        Change the artists to match the new CascadeLayout
+        """
+        old = self.layout
+        self.layout = layout
+        changed = False
+
+        if self.batch is None:
+            changed |= self._sync_boxes(old)
+        elif not _components_equal(old.boxes, layout.boxes):
+            changed = True
+            if self.batch == "cascade":
+                _render_box_collections(self.ax, layout, slice(None),
+                                        self.style, self.box_collections)
+            else:
+                for stack_idx in range(max(old.n_stacks, layout.n_stacks)):
+                    _render_box_collections(
+                        self.ax, layout, layout.indices("boxes", stack_idx),
+                        self.style, self.box_collections, stack_idx)
+
+        for component in ("box_labels", "bar_labels"):
+            changed |= self._sync_texts(old, component)
+        changed |= self._sync_relative_bars(old)
+        if self.batch is None:
+            changed |= self._sync_texts(old, "explode_labels")
+            changed |= self._sync_explode_lines(old)
+            changed |= self._sync_explode_bgs(old)
+        elif not all(_components_equal(getattr(old, component),
+                                       getattr(layout, component))
+                     for component in ("explode_lines", "explode_labels",
+                                       "explode_bgs")):
+            changed = True
+            self._sync_wedge_collections(old)
+
+        if changed:
+            self.ax.relim()
+            collections = list(self.box_collections.values()) + [
+                collection for component, collection in
+                self.wedge_collections.items()
+                if component != "explode_labels"]
+            for collection in collections:
+                self.ax.update_datalim(
+                    collection.get_datalim(self.ax.transData).get_points())
+            self.ax.autoscale_view()
+            if self.rasterize:
+                self.set_rasterize(True)
+
+    def _sync_wedge_collections(self, old):
+        if _render_wedge_collections(self.ax, self.layout,
+                                     self.wedge_collections, self.style):
+            # The labels are text paths now
+            self._resize("explode_labels", 0, None,
+                         lambda text: text.remove())
+            return
+        if self.artists["explode_labels"]:
+            self._sync_texts(old, "explode_labels")
         else:
-            bar_sums.append(sum)
+            self._resize("explode_labels",
+                         len(self.layout.explode_labels["x"]),
+                         lambda idx: _render_text(self.ax, self.layout,
+                                                  "explode_labels", idx,
+                                                  self.style),
+                         None)
+
+    def _resize(self, component, size, create, remove):
+        # Create or remove artists until there are size
+        artists = self.artists[component]
+        while len(artists) > size:
+            remove(artists.pop())
+        for idx in range(len(artists), size):
+            artists.append(create(idx))
+
+    def _sync_boxes(self, old):
+        boxes = self.layout.boxes
+        containers = self.artists["boxes"]
+        changed = _changed_entries(old.boxes, boxes)
+        for idx in changed:
+            rect = containers[idx].patches[0]
+            if _entry_changed(old.boxes, boxes, idx,
+                              ("x", "bottom", "width", "height")):
+                rect.set_bounds(boxes["x"][idx], boxes["bottom"][idx],
+                                boxes["width"][idx], boxes["height"][idx])
+                rect.sticky_edges.y[:] = [boxes["bottom"][idx]]
+            if _entry_changed(old.boxes, boxes, idx, ("emphasis",)):
+                rect.update(self.style.box_kwargs[bool(boxes["emphasis"][idx])])
+            if _entry_changed(old.boxes, boxes, idx,
+                              ("facecolor", "edgecolor")):
+                rect.set_facecolor(boxes["facecolor"][idx])
+                rect.set_edgecolor(boxes["edgecolor"][idx])
+            if _entry_changed(old.boxes, boxes, idx, ("label",)):
+                rect.set_label(boxes["label"][idx])
+
+        self._resize("boxes", len(boxes["x"]),
+                     lambda idx: _render_box(self.ax, self.layout, idx,
+                                             self.style),
+                     lambda container: container.remove())
+        return len(changed) > 0 or len(old.boxes["x"]) != len(boxes["x"])
+
+    def _sync_texts(self, old, component):
+        labels = getattr(self.layout, component)
+        old_labels = getattr(old, component)
+        texts = self.artists[component]
+        changed = _changed_entries(old_labels, labels)
+        for idx in changed:
+            if _entry_changed(old_labels, labels, idx, ("x", "y")):
+                texts[idx].set_position((labels["x"][idx], labels["y"][idx]))
+            if _entry_changed(old_labels, labels, idx, ("text",)):
+                texts[idx].set_text(labels["text"][idx])
+
+        self._resize(component, len(labels["x"]),
+                     lambda idx: _render_text(self.ax, self.layout,
+                                              component, idx, self.style),
+                     lambda text: text.remove())
+        return len(changed) > 0 or len(old_labels["x"]) != len(labels["x"])
+
+    def _sync_relative_bars(self, old):
+        relative = self.layout.relative_bars
+        changed = _changed_entries(old.relative_bars, relative)
+        for idx in changed:
+            self.artists["relative_bars"][idx].patches[0].set_bounds(
+                relative["x"][idx], 0, relative["width"][idx],
+                relative["height"][idx])
+
+        self._resize("relative_bars", len(relative["x"]),
+                     lambda idx: _render_relative_bar(self.ax, self.layout,
+                                                      idx, self.style),
+                     lambda container: container.remove())
+        return len(changed) > 0 or \
+               len(old.relative_bars["x"]) != len(relative["x"])
+
+    def _sync_explode_lines(self, old):
+        lines = self.layout.explode_lines
+        changed = _changed_entries(old.explode_lines, lines)
+        for idx in changed:
+            line_bottom, line_top = self.artists["explode_lines"][idx]
+            line_bottom.set_data(lines["xs"][idx], lines["ys_bottom"][idx])
+            line_top.set_data(lines["xs"][idx], lines["ys_top"][idx])
+
+        def remove(pair):
+            for line in pair:
+                line.remove()
+
+        self._resize("explode_lines", len(lines["xs"]),
+                     lambda idx: _render_explode_lines(self.ax, self.layout,
+                                                       idx, self.style),
+                     remove)
+        return len(changed) > 0 or \
+               len(old.explode_lines["xs"]) != len(lines["xs"])
+
+    def _sync_explode_bgs(self, old):
+        bgs = self.layout.explode_bgs
+        changed = _changed_entries(old.explode_bgs, bgs)
+        for idx in changed:
+            self.artists["explode_bgs"][idx].set_path(
+                _explode_bg_path(bgs["verts"][idx]))
+
+        self._resize("explode_bgs", len(bgs["verts"]),
+                     lambda idx: _render_explode_bg(self.ax, self.layout, idx,
+                                                    self.style),
+                     lambda patch: patch.remove())
+        return len(changed) > 0 or \
+               len(old.explode_bgs["verts"]) != len(bgs["verts"])
+
+
+def _entry_changed(old, new, idx, fields):
+    return any(numpy.any(old[field][idx] != new[field][idx])
+               for field in fields)
+
+
+def _changed_entries(old, new):
+    """
+    Helper function returning the indices of the entries that differ between
+    two versions of a layout component (only the entries in both)
+    """
+    size = min(len(array) for array in list(old.values()) + list(new.values()))
+    changed = numpy.zeros(size, dtype=bool)
+    if size == 0:
+        return numpy.flatnonzero(changed)
+    for field in new:
+        difference = old[field][:size] != new[field][:size]
+        changed |= difference.reshape(size, -1).any(axis=1)
+    return numpy.flatnonzero(changed)
+
+
+def _components_equal(old, new):
+    return all(old[field].shape == new[field].shape and
+               numpy.all(old[field] == new[field]) for field in new)
+
+
+def render_cascade_layout(ax, layout, batch=None, emphasis=None,
+                          bar_labels=None, lod=None, instrument=None,
+                          style=None, rasterize=False):
+    """
+    Draw a CascadeLayout on ax, for batch, instrument, style and rasterize
+    see cascaded_exploding_barcharts (use the style of the layout)
+    Returns a CascadeArtists handle, emphasis, bar_labels, lod, instrument
+    and style are stored in it for later updates
+    """
+    artists = CascadeArtists(ax, layout, batch, emphasis, bar_labels, lod,
+                             instrument, style)
+    with _span(instrument, "render") as span:
+        _render_stacks(ax, layout, batch, artists, instrument)
+        span.set("artists", _span_count(span, artists))
+    if rasterize:
+        artists.set_rasterize(True)
+    return artists
+
+
+class CascadeViewport(object):
+    """
+    Handle on a virtualized chart as returned by cascaded_exploding_barcharts
+    with virtual=True. The complete layout is kept but artists are only
+    created for the stacks inside the x limits of the Axes (and the wedges
+    starting at them). Panning and zooming creates and removes the artists
+    through the xlim_changed callback, so memory use and redraw time depend
+    on the visible stacks only.
+
+    slots:  dict stack index -> CascadeArtists of the drawn stacks, each with
+            the stack and the wedges towards it
+    The other attributes and methods are as for CascadeArtists.
+    """
+
+    def __init__(self, ax, layout, batch=None, emphasis=None,
+                 bar_labels=None, lod=None, instrument=None, style=None,
+                 rasterize=False):
+        self.ax = ax
+        self.layout = layout
+        self.batch = batch
+        self.emphasis = emphasis
+        self.bar_labels = bar_labels
+        self.lod = lod
+        self.instrument = instrument
+        self.style = cascade_style(style)
+        self.rasterize = rasterize
+        self.slots = {}
+        self._refreshing = False
+        self._pending = False
+        self._update_datalim()
+        self._callback = ax.callbacks.connect(
+            "xlim_changed", lambda ax: self.refresh())
+        self.refresh()
+
+    def _update_datalim(self):
+        # The data limits of the complete chart, not only of the drawn part
+        bounds = self.layout.bounds()
+        if bounds is not None:
+            self.ax.update_datalim(bounds)
+        self.ax.autoscale_view()
+
+    def visible_stacks(self):
+        """
+        Returns the range of the stacks inside the x limits of the Axes. Stack
+        i covers [i - 0.5, i + 1): the wedges towards it, the stack and its
+        labels
+        """
+        xmin, xmax = sorted(self.ax.get_xlim())
+        begin = max(int(numpy.floor(xmin)), 0)
+        end = min(int(numpy.ceil(xmax + 0.5)), self.layout.n_stacks)
+        return range(begin, max(begin, end))
+
+    def refresh(self):
+        """
+        Create the artists of the stacks that became visible and remove the
+        artists of the stacks that are no longer visible
+        """
+        if self._refreshing:
+            # Called again by a limit change while drawing
+            self._pending = True
+            return
+        self._refreshing = True
+        try:
+            self._pending = True
+            while self._pending:
+                self._pending = False
+                self._refresh()
+        finally:
+            self._refreshing = False
+
+    def _refresh(self):
+        # The data limits are set for the complete chart, skip the autoscaling
+        # while adding the artists
+        autoscale = self.ax.get_autoscalex_on(), self.ax.get_autoscaley_on()
+        self.ax.set_autoscale_on(False)
+        try:
+            self._update_slots()
+        finally:
+            self.ax.set_autoscalex_on(autoscale[0])
+            self.ax.set_autoscaley_on(autoscale[1])
+
+    def _update_slots(self):
+        visible = self.visible_stacks()
+        for stack_idx in list(self.slots):
+            if stack_idx not in visible:
+                self.slots.pop(stack_idx).remove()
+        for stack_idx in visible:
+            if stack_idx in self.slots:
+                continue
+            layout = self.layout.subset([stack_idx], [stack_idx - 1])
+            slot = CascadeArtists(self.ax, layout, self.batch,
+                                  instrument=self.instrument, style=self.style)
+            _render_stacks(self.ax, layout, self.batch, slot, self.instrument,
+                           [stack_idx])
+            if self.rasterize:
+                slot.set_rasterize(True)
+            self.slots[stack_idx] = slot
+
+    @property
+    def legend_handles(self):
+        return _legend_handles(self.layout, self.style)
+
+    def count(self):
+        """
+        Returns the number of artists drawn
+        """
+        return sum(slot.count() for slot in self.slots.values())
+
+    def set_rasterize(self, rasterize=True):
+        self.rasterize = rasterize
+        for slot in self.slots.values():
+            slot.set_rasterize(rasterize)
+
+    def update(self, data, emphasis=None, bar_labels=None):
+        """
+        Update the chart with new data (emphasis and bar_labels are kept when
+        None), the visible stacks are drawn again
+        """
+        if emphasis is None:
+            emphasis = self.emphasis
+        if bar_labels is None:
+            bar_labels = self.bar_labels
+        self.emphasis = emphasis
+        self.bar_labels = bar_labels
+        self.set_layout(_axes_cascade_layout(
+            self.ax, data, emphasis, bar_labels, self.layout.representation,
+            self.lod, self.instrument, self.style))
+
+    def set_layout(self, layout):
+        self.layout = layout
+        self.remove()
+        self._update_datalim()
+        self.refresh()
+
+    def remove(self):
+        """
+        Remove all the drawn artists (they are created again by refresh())
+        """
+        for slot in self.slots.values():
+            slot.remove()
+        self.slots.clear()
+
+    def disconnect(self):
+        """
+        Stop following the x limits of the Axes
+        """
+        self.ax.callbacks.disconnect(self._callback)
+
+
+def _render_stacks(ax, layout, batch, artists, instrument, stacks=None):
+    if stacks is None:
+        stacks = range(layout.n_stacks)
+    for stack_idx in stacks:
+        with _span(instrument, "render_stack", stack_idx) as span:
+            count = _span_count(span, artists)
+            _render_stack(ax, layout, batch, artists, stack_idx)
+            span.set("artists", _span_count(span, artists) - count)
+
+    if batch is not None:
+        with _span(instrument, "render_collections") as span:
+            count = _span_count(span, artists)
+            if batch == "cascade":
+                _render_box_collections(ax, layout, slice(None),
+                                        artists.style,
+                                        artists.box_collections)
+            # All the wedges of the cascade at once
+            if not _render_wedge_collections(ax, layout,
+                                             artists.wedge_collections,
+                                             artists.style):
+                artists.artists["explode_labels"].extend(
+                    _render_text(ax, layout, "explode_labels", idx,
+                                 artists.style)
+                    for idx in range(len(layout.explode_labels["x"])))
+            span.set("artists", _span_count(span, artists) - count)
+
+
+def _render_stack(ax, layout, batch, artists, stack_idx):
+    style = artists.style
+    # The wedges towards this stack, when batching they are drawn at once
+    if batch is None:
+        for wedge_idx in layout.indices("explode_lines", stack_idx - 1):
+            _render_wedge(ax, layout, wedge_idx, style, artists)
+
+    if batch is None:
+        artists.artists["boxes"].extend(
+            _render_box(ax, layout, idx, style)
+            for idx in layout.indices("boxes", stack_idx))
+    elif batch == "stack":
+        _render_box_collections(ax, layout,
+                                layout.indices("boxes", stack_idx), style,
+                                artists.box_collections, stack_idx)
+
+    for component in ("box_labels", "bar_labels"):
+        artists.artists[component].extend(
+            _render_text(ax, layout, component, idx, style)
+            for idx in layout.indices(component, stack_idx))
+
+    # Add the relative size bar
+    artists.artists["relative_bars"].extend(
+        _render_relative_bar(ax, layout, idx, style)
+        for idx in layout.indices("relative_bars", stack_idx))
+
+
+def _axes_cascade_layout(ax, data, emphasis, bar_labels, representation,
+                         lod=None, instrument=None, style=None):
+    """
+    Helper function computing the layout for drawing on ax, with lod the
+    level of detail threshold in pixels (see cascaded_exploding_barcharts)
+    """
+    threshold = None
+    if lod:
+        cascade = CascadeData.from_data(data)
+        _, bar_sums = cascade.normalize(representation)
+        sums = cascade.stack_sums()
+        if representation is not None:
+            sums = numpy.full(len(sums), 100. if representation ==
+                              "percentage" else 1.)
+        top = max(numpy.max(sums, initial=0.), numpy.max(bar_sums, initial=0.))
+        threshold = lod_threshold(ax, top, lod)
+        data = cascade
+
+    return cascade_layout(data, emphasis, bar_labels, representation,
+                          ax.figure.dpi, threshold, instrument, style)
 
-    return bar_sums
 
 def cascaded_exploding_barcharts(ax, data, emphasis, bar_labels,
-                                 representation=None):
+                                 representation=None, batch=None, lod=None,
+                                 instrument=None, style=None, rasterize=False,
+                                 virtual=False):
     """
     Insert a cascaded exploding barchart into ax
 
@@ -529,6 +2603,7 @@ def cascaded_exploding_barcharts(ax, data, emphasis, bar_labels,
             where each bar-chart is a list triplet containing:
             [value, label, #color]
             See run_example for detailed example
+            Or a CascadeData with the columnar version of the data
 
     emphasis: The entries in the bar-chart to emphasize and explode from and TO
             3d array: A list of paired ranges
@@ -537,6 +2612,8 @@ def cascaded_exploding_barcharts(ax, data, emphasis, bar_labels,
             from the emphasized range
             e.g. To create the explosion lines in the graphical example you
             would use paired range: [[1,2,"left"],[1,2,"right"]] 
+            Begin and end can also be box labels or predicates on the
+            labels, e.g. [["bar_1","bar_3","left"],[0,None,"right"]]
 
     bar_labels: An optional label to be printed above each stack bar-chart
             (EL in the graphical example)
@@ -550,32 +2627,97 @@ def cascaded_exploding_barcharts(ax, data, emphasis, bar_labels,
             Has influence on the y-axis labels and how to label printing is 
             controlled.
 
+    batch:  None, draw every box with a separate ax.bar call
+            "stack": draw the boxes of each stack as one collection for the
+                     normal and one for the emphasized boxes
+            "cascade": same but one pair of collections for all stacks
+            When batching, the explosion lines, backgrounds and labels of
+            all wedges are drawn as one collection each (see
+            CascadeArtists.wedge_collections). The labels are drawn as text
+            paths unless explode_label_text has settings only a Text has
+            (e.g. rotation or bbox) or a label has multiple lines.
+
+    lod:    Level of detail, None or a height in pixels. Runs of boxes smaller
+            than lod pixels (on ax) are merged into a single "other" box. The
+            emphasized boxes and the explosion lines stay exact.
+
+    instrument: None, or receives timed SpanEvents for each phase and each
+            stack, with the number of created artists and removed box labels:
+            a callable called with each finished SpanEvent (e.g. list.append)
+            or an object with a span(event) method returning a context
+            manager that is entered and exited around the span (for
+            existing tracing). Without instrument nothing is measured.
+
+    style:  The typesetting of this chart: a CascadeStyle or a dict with the
+            typesetting entries to change. Default: exp_barch_tp_set as it
+            is at the call. The style is kept for handle.update().
+
+    rasterize: Mixed raster/vector output for large charts in svg and pdf:
+            the normal boxes, relative bars and wedge backgrounds are
+            rasterized (at the dpi of savefig), the labels, explosion lines
+            and emphasized boxes stay vector. Also handle.set_rasterize().
+
+    virtual: Interactive mode for cascades with many stacks: only the stacks
+            (and their wedges) inside the x limits of ax are drawn, panning
+            and zooming creates and removes the artists. Returns a
+            CascadeViewport handle instead.
+
+    Returns a CascadeArtists handle: use handle.update(data) to change the
+    chart in place (e.g. for live data) and handle.legend_handles for
+    ax.legend(handles=...)
+
     See sourcefile desciption for detailed explanation
     """
-    # Get a deep copy to allow mutations on the data for normalization
-    data_internal = copy.deepcopy(data)
-    bar_sums = normalize_or_percentage_data(data_internal, representation)
-
-    # First bar is created outside of the loop, because we to explode n-1 times
-
-
-    create_bar_chart_with_emphasis(ax, data_internal[0], emphasis[0], bar_labels[0], bar_sums[0],
-                                   0)
-
-    # Todo this -1 is ugly!! but needed for the explosion lines: I like the
-    # location better at this place in the loop
-    for idx in range(len(data_internal)-1):    
-        for emphasis_subset in emphasis[idx]:
-            display_explosion(ax, data_internal, emphasis_subset,
-                              representation, chart_id=idx)
-
-
-        create_bar_chart_with_emphasis(ax, data_internal[idx+1], 
-                emphasis[idx+1], bar_labels[idx+1], bar_sums[idx+1],
-                idx+1)
+    style = cascade_style(style)
+    layout = _axes_cascade_layout(ax, data, emphasis, bar_labels,
+                                  representation, lod, instrument, style)
+    if virtual:
+        return CascadeViewport(ax, layout, batch, emphasis, bar_labels, lod,
+                               instrument, style, rasterize)
+    return render_cascade_layout(ax, layout, batch, emphasis, bar_labels, lod,
+                                 instrument, style, rasterize)
+
+
+def render_to_bytes(data, emphasis, bar_labels, representation=None,
+                    format="png", dpi=100, figsize=(6.4, 4.8), batch=None,
+                    lod=None, title=None, stack_labels=None, makeup=True,
+                    instrument=None, style=None, rasterize=False,
+                    raster_dpi=None):
+    """
+    Render a chart to an image in memory, without pyplot: the chart is drawn
+    on its own Figure with an Agg canvas, the pyplot figures, backend and
+    state are never touched (safe for headless workers and servers). With a
+    CascadeStyle charts can be rendered in parallel threads.
+
+    data, emphasis, bar_labels, representation, batch, lod, instrument,
+            style and rasterize: see cascaded_exploding_barcharts
+    format: image format supported by matplotlib, e.g. png, svg or pdf
+    dpi, figsize: of the Figure, figsize in inches
+    raster_dpi: the dpi of the rasterized geometry in svg and pdf (default
+            dpi)
+    title, stack_labels, makeup: with makeup chart_makeup is applied
+
+    Returns the bytes of the image
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    figure = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(figure)
+    ax = figure.add_subplot()
+    cascaded_exploding_barcharts(ax, data, emphasis, bar_labels,
+                                 representation, batch, lod, instrument, style,
+                                 rasterize)
+    if makeup:
+        chart_makeup(ax, title, stack_labels)
+
+    # In vector formats the dpi is only used for the rasterized parts
+    if rasterize and raster_dpi and format not in ("png", "jpg", "jpeg"):
+        dpi = raster_dpi
+    output = io.BytesIO()
+    figure.savefig(output, format=format, dpi=dpi)
+    return output.getvalue()
         
 
 if __name__ == "__main__":
     run_example()
-
-    
\ No newline at end of file
@@ -0,0 +1,8 @@
+import os
+import sys
+
+import matplotlib
+
+# The modules are in the root of the repository, no display needed
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+matplotlib.use("Agg")
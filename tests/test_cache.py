@@ -0,0 +1,70 @@
+import os
+import time
+
+import cascade_cache
+
+
+DATA = [[[1., "a", "#3F8080"], [2., "b", "#346080"], [3., "c", "#30A280"]],
+        [[1., "x", "#3F8080"], [4., "y", "#346080"]]]
+BAR_LABELS = ["first", "second"]
+
+
+def test_entry_of_other_cache_is_found(tmp_path):
+    writer = cascade_cache.RenderCache(memory=False, directory=str(tmp_path))
+    reader = cascade_cache.RenderCache(memory=False, directory=str(tmp_path))
+    png = writer.render(DATA, None, BAR_LABELS)
+    assert reader.render(DATA, None, BAR_LABELS) == png
+    stats = reader.stats()
+    assert (stats["disk_hits"], stats["misses"]) == (1, 0)
+
+
+def test_eviction_sees_entries_of_other_caches(tmp_path):
+    first = cascade_cache.RenderCache(memory=False, directory=str(tmp_path),
+                                      max_entries=3)
+    second = cascade_cache.RenderCache(memory=False, directory=str(tmp_path),
+                                       max_entries=3)
+    for key in ("k1", "k2", "k3"):
+        first.put(key, b"value")
+        # Distinct modification times, the least recently used is k1
+        time.sleep(.01)
+    second.put("k4", b"value")
+    assert sorted(os.listdir(str(tmp_path))) == ["k2", "k3", "k4"]
+    assert second.get("k1") is None
+
+
+def test_instrument_is_not_part_of_the_key():
+    cache = cascade_cache.RenderCache()
+    events = []
+    png = cache.render(DATA, None, BAR_LABELS, instrument=events.append)
+    assert events
+    assert cache.render(DATA, None, BAR_LABELS) is png
+
+
+def test_memory_hit():
+    cache = cascade_cache.RenderCache()
+    png = cache.render(DATA, None, BAR_LABELS)
+    assert cache.render(DATA, None, BAR_LABELS) is png
+    assert cache.stats()["memory_hits"] == 1
+
+
+def test_label_and_predicate_emphasis_share_the_index_key():
+    by_index = [[[[1, 2, "E"], [0, 1, None]]], None]
+    by_label = [[[["b", "c", "E"], [lambda label: label == "x", "y", None]]],
+                None]
+    assert cascade_cache.render_key(DATA, by_label, BAR_LABELS) == \
+        cascade_cache.render_key(DATA, by_index, BAR_LABELS)
+    assert cascade_cache.layout_key(DATA, by_label, BAR_LABELS) == \
+        cascade_cache.layout_key(DATA, by_index, BAR_LABELS)
+
+    cache = cascade_cache.RenderCache()
+    png = cache.render(DATA, by_label, BAR_LABELS)
+    assert cache.render(DATA, by_index, BAR_LABELS) is png
+
+
+def test_cached_layout_round_trip(tmp_path):
+    emphasis = [[[[1, 2, "E"], [0, 1, "T"]]], None]
+    cache = cascade_cache.RenderCache(memory=False, directory=str(tmp_path))
+    layout = cache.layout(DATA, emphasis, BAR_LABELS, "percentage", dpi=100)
+    cached = cascade_cache.RenderCache(directory=str(tmp_path)).layout(
+        DATA, emphasis, BAR_LABELS, "percentage", dpi=100)
+    assert cached.to_json() == layout.to_json()
@@ -0,0 +1,51 @@
+import numpy
+import pytest
+
+import cascadedexplodingbarcharts as cebc
+
+
+def _data(*stacks):
+    return cebc.CascadeData.from_data([[[value, "box", "#3F8080"]
+                                        for value in stack]
+                                       for stack in stacks])
+
+
+def test_normalize():
+    normalized, bar_sums = _data([1., 3.], [2., 2., 4.]).normalize(
+        "percentage")
+    numpy.testing.assert_allclose(normalized.values,
+                                  [25., 75., 25., 25., 50.])
+    numpy.testing.assert_allclose(bar_sums, [100., 200.])
+
+
+@pytest.mark.parametrize("representation", ["normalized", "percentage"])
+@pytest.mark.parametrize("stacks, stack", [
+    (([1., 3.], [0., 0.]), 1),
+    (([0.], [2., 2.]), 0),
+    (([], [2., 2.]), 0)])
+def test_zero_stack_can_not_be_normalized(stacks, stack, representation):
+    with pytest.raises(ValueError, match="stack %d sums to zero" % stack):
+        _data(*stacks).normalize(representation)
+
+
+def test_zero_stack_without_normalizing():
+    cascade, sums = _data([1., 3.], [0., 0.]).normalize()
+    numpy.testing.assert_array_equal(sums, [4., 0.])
+
+
+def test_float64_memmap_is_not_copied(tmp_path):
+    values = numpy.memmap(str(tmp_path / "values"), dtype=float, mode="w+",
+                          shape=(4,))
+    values[:] = [1., 2., 3., 4.]
+    offsets = numpy.array([0, 2, 4], dtype=numpy.intp)
+    labels = numpy.array(["a", "b", "c", "d"], dtype=object)
+    cascade = cebc.CascadeData(values, offsets, labels, labels)
+    assert numpy.shares_memory(cascade.values, values)
+    assert numpy.shares_memory(cascade.offsets, offsets)
+    assert cascade.labels is labels
+
+
+def test_other_dtypes_are_converted():
+    values = numpy.array([1., 2.], dtype=numpy.float32)
+    cascade = cebc.CascadeData(values, [0, 2], ["a", "b"], ["a", "b"])
+    assert cascade.values.dtype == numpy.float64
@@ -0,0 +1,82 @@
+import matplotlib.pyplot as plt
+import numpy
+import pytest
+
+import cascadedexplodingbarcharts as cebc
+from cascade_inspect import CascadeInspector, SegmentIndex
+
+
+DATA = [[[2, "foo_1", "#3F8080"], [2, "foo_2", "#346080"],
+         [3, "foo_3", "#30A280"], [4, "bar_1", "#CFA080"]],
+        [[2, "foo_1", "#3F8080"], [2, "foo_2", "#346080"],
+         [1, "foo_3", "#30A280"], [0.4, "bar_1", "#CFA080"]]]
+EMPHASIS = [[[[1, 2, "E"], [1, 2, "T"]]], [None]]
+BAR_LABELS = ["first", "second"]
+
+
+@pytest.fixture
+def layout():
+    return cebc.cascade_layout(DATA, EMPHASIS, BAR_LABELS, "percentage")
+
+
+def _wedge_point(layout, wedge, fraction=.5):
+    lines = layout.explode_lines
+    x0, x1 = lines["xs"][wedge]
+    bottom = numpy.interp(fraction, [0, 1], lines["ys_bottom"][wedge])
+    top = numpy.interp(fraction, [0, 1], lines["ys_top"][wedge])
+    return x0 + (x1 - x0) * fraction, bottom, top
+
+
+def test_box_hit(layout):
+    boxes = layout.boxes
+    index = SegmentIndex(layout)
+    for box in range(len(boxes["x"])):
+        hit = index.hit(boxes["x"][box] + boxes["width"][box] / 2,
+                        boxes["bottom"][box] + boxes["height"][box] / 2)
+        assert (hit.kind, hit.index, hit.label) == \
+            ("box", box, boxes["label"][box])
+    # foo_3 of the first stack: 3 of 11
+    hit = index.hit(boxes["x"][2] + .01, boxes["bottom"][2] + .01)
+    assert hit.stack == 0
+    assert hit.percentage == pytest.approx(100. * 3 / 11)
+
+
+def test_wedge_hit(layout):
+    x, bottom, top = _wedge_point(layout, 0)
+    hit = SegmentIndex(layout).hit(x, (bottom + top) / 2)
+    assert (hit.kind, hit.index, hit.stack) == ("wedge", 0, 0)
+    assert hit.label == "E > T"
+    assert hit.percentage == pytest.approx(100. * 5 / 11)
+
+
+def test_miss_in_the_gap_between_stacks(layout):
+    x, bottom, top = _wedge_point(layout, 0)
+    index = SegmentIndex(layout)
+    # Below and above the wedge, between the stacks
+    assert index.hit(x, bottom / 2) is None
+    assert index.hit(x, top + 1) is None
+    assert index.hit(-10, 50) is None
+
+
+def test_index_follows_update():
+    figure, ax = plt.subplots()
+    try:
+        handle = cebc.cascaded_exploding_barcharts(ax, DATA, EMPHASIS,
+                                                   BAR_LABELS)
+        inspector = CascadeInspector(handle)
+        old = inspector.index()
+        assert inspector.index() is old
+        boxes = handle.layout.boxes
+        x = boxes["x"][3] + boxes["width"][3] / 2
+        # Above the last box of the first stack (sum 11)
+        assert inspector.hit_test(x, 15) is None
+
+        changed = [[[value * 2, label, color]
+                    for value, label, color in stack] for stack in DATA]
+        handle.update(changed)
+        assert inspector.index() is not old
+        hit = inspector.hit_test(x, 15)
+        assert (hit.kind, hit.label, hit.value) == ("box", "bar_1", 8.)
+        inspector.disconnect()
+    finally:
+        plt.close(figure)
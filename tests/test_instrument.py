@@ -0,0 +1,48 @@
+import matplotlib.pyplot as plt
+import pytest
+
+import cascadedexplodingbarcharts as cebc
+
+
+DATA = [[[float(idx % 7 + 1), "box_%d" % idx, "#3F8080"]
+         for idx in range(20)] for _ in range(4)]
+
+
+@pytest.fixture
+def counted(monkeypatch):
+    calls = []
+    count = cebc.CascadeArtists.count
+
+    def counting(self):
+        calls.append(self)
+        return count(self)
+    monkeypatch.setattr(cebc.CascadeArtists, "count", counting)
+    return calls
+
+
+@pytest.mark.parametrize("batch", [None, "stack", "cascade"])
+def test_no_counting_without_instrument(counted, batch):
+    figure, ax = plt.subplots()
+    try:
+        handle = cebc.cascaded_exploding_barcharts(ax, DATA, None,
+                                                   [None] * 4, batch=batch)
+        handle.update(DATA)
+    finally:
+        plt.close(figure)
+    assert counted == []
+
+
+def test_spans_count_the_artists(counted):
+    events = []
+    figure, ax = plt.subplots()
+    try:
+        cebc.cascaded_exploding_barcharts(ax, DATA, None, [None] * 4,
+                                          instrument=events.append)
+    finally:
+        plt.close(figure)
+    stacks = [event.attributes["artists"] for event in events
+              if event.name == "render_stack"]
+    render = [event.attributes["artists"] for event in events
+              if event.name == "render"]
+    assert len(stacks) == 4 and all(stacks)
+    assert render == [sum(stacks)]
@@ -0,0 +1,102 @@
+import pytest
+
+import cascade_loader
+
+
+def test_categories_of_a_stack_get_distinct_colors():
+    aggregator = cascade_loader.CascadeAggregator()
+    categories = ["assemble", "solve", "io", "setup", "mpi", "output"]
+    for category in categories:
+        aggregator.add("stack", category, 1.)
+    data, _ = aggregator.to_data()
+    colors = [color for _, _, color in data[0]]
+    assert colors == cascade_loader.category_palette[:len(categories)]
+
+
+def test_palette_has_no_grays():
+    # The gray of the lod "other" boxes must not be a category
+    assert "#c7c7c7" not in cascade_loader.category_palette
+    assert "#7f7f7f" not in cascade_loader.category_palette
+
+
+def test_seeded_colors_are_kept_and_skipped():
+    first, second = cascade_loader.category_palette[:2]
+    colors = {"solve": first}
+    aggregator = cascade_loader.CascadeAggregator(colors=colors)
+    aggregator.add("stack", "assemble", 1.)
+    aggregator.add("stack", "solve", 1.)
+    assert colors == {"solve": first, "assemble": second}
+
+
+def test_explicit_color_wins():
+    aggregator = cascade_loader.CascadeAggregator()
+    aggregator.add("stack", "solve", 1., "#123456")
+    aggregator.add("stack", "solve", 1.)
+    assert aggregator.to_data()[0] == [[[2., "solve", "#123456"]]]
+
+
+def test_colors_repeat_after_the_palette():
+    colors = cascade_loader.CategoryColors(palette=["#ff0000", "#00ff00"])
+    assert [colors(name) for name in "abcd"] == \
+        ["#ff0000", "#00ff00", "#ff0000", "#00ff00"]
+
+
+def test_csv_header_only_on_the_first_line():
+    assert cascade_loader.parse_line("stack,category,value", "csv",
+                                     first=True) is None
+    assert cascade_loader.parse_line("a,x,1.5", "csv", first=True) == \
+        ("a", "x", 1.5)
+    with pytest.raises(ValueError):
+        cascade_loader.parse_line("stack,category,value", "csv")
+
+
+def test_bad_row_in_a_file_raises(tmp_path):
+    log = tmp_path / "timings.csv"
+    log.write_text("stack,category,value\na,x,1\na,y,oops\n")
+    with pytest.raises(ValueError):
+        cascade_loader.load_cascade(str(log))
+
+
+def test_tsv(tmp_path):
+    log = tmp_path / "timings.tsv"
+    log.write_text("stack\tcategory\tvalue\n"
+                   "a\tx, y\t1\na\tz\t2\tred\nb\tx, y\t3\n")
+    data, bar_labels = cascade_loader.load_cascade(str(log))
+    assert bar_labels == ["a", "b"]
+    assert [[entry[:2] for entry in stack] for stack in data] == \
+        [[[1., "x, y"], [2., "z"]], [[3., "x, y"]]]
+    assert data[0][1][2] == "red"
+
+
+def test_jsonl_objects_and_lists(tmp_path):
+    log = tmp_path / "timings.jsonl"
+    log.write_text('{"stack": "a", "category": "x", "value": 1}\n'
+                   '\n'
+                   '["a", "x", 2]\n'
+                   '{"stack": "b", "category": "y", "value": 3, '
+                   '"color": "#123456"}\n')
+    data, bar_labels = cascade_loader.load_cascade(str(log))
+    assert bar_labels == ["a", "b"]
+    assert data[0][0][:2] == [3., "x"]
+    assert data[1][0] == [3., "y", "#123456"]
+
+
+def test_follow_waits_for_complete_lines(tmp_path, monkeypatch):
+    monkeypatch.setattr(cascade_loader, "FOLLOW_CHUNK_SIZE", 8)
+    log = tmp_path / "timings.csv"
+    log.write_text("stack,category,value\na,x,1\n")
+    follow = cascade_loader.follow_cascade(str(log), interval=0.)
+
+    def values():
+        data, _ = next(follow)
+        return [[entry[:2] for entry in stack] for stack in data]
+
+    assert values() == [[[1., "x"]]]
+    with open(str(log), "a") as log_file:
+        log_file.write("a,x,2\nb,")
+    # The incomplete last line waits for the next poll
+    assert values() == [[[3., "x"]]]
+    with open(str(log), "a") as log_file:
+        log_file.write("y,4\n")
+    assert values() == [[[3., "x"]], [[4., "y"]]]
+    follow.close()
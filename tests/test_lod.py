@@ -0,0 +1,64 @@
+import numpy
+import pytest
+
+import cascadedexplodingbarcharts as cebc
+
+
+def _small_stacks(n_stacks=3, size=2000):
+    # Boxes far below the threshold, every run of them can be merged
+    rng = numpy.random.RandomState(0)
+    return [[[float(value), "box_%d_%d" % (stack_idx, idx), "#3F8080"]
+             for idx, value in enumerate(rng.uniform(.001, .01, size))]
+            for stack_idx in range(n_stacks)]
+
+
+def _stack_boxes(layout, stack_idx):
+    return layout.boxes["bottom"][layout.indices("boxes", stack_idx)]
+
+
+def test_whole_stack_target_is_merged():
+    data = _small_stacks()
+    emphasis = [[[[10, 19, None], [500, 1499, None]]],
+                [[[0, 1, None], [0, None, None]]],
+                None]
+    layout = cebc.cascade_layout(data, emphasis, [None] * 3,
+                                 lod_threshold=1.)
+    # stack 0: the 10 emphasized boxes and the runs below and above them
+    # stack 1: the 2 emphasized boxes and the runs split at the target bounds
+    # stack 2: a single box, the explosion lines end on the stack bounds
+    assert [len(_stack_boxes(layout, idx)) for idx in range(3)] == [12, 5, 1]
+
+
+def test_target_bounds_stay_exact():
+    data = _small_stacks()
+    emphasis = [[[[10, 19, None], [500, 1499, None]]], None, None]
+    layout = cebc.cascade_layout(data, emphasis, [None] * 3,
+                                 lod_threshold=1.)
+    exact = cebc.cascade_layout(data, emphasis, [None] * 3)
+
+    bottoms = _stack_boxes(layout, 1)
+    exact_bottoms = _stack_boxes(exact, 1)
+    # A merged box ends on each bound (up to the rounding of the sums)
+    for bound in (500, 1500):
+        assert numpy.isclose(bottoms, exact_bottoms[bound]).any()
+    numpy.testing.assert_array_equal(layout.explode_lines["ys_bottom"],
+                                     exact.explode_lines["ys_bottom"])
+    numpy.testing.assert_array_equal(layout.explode_lines["ys_top"],
+                                     exact.explode_lines["ys_top"])
+
+
+def test_first_stack_ignores_targets_of_last_stack():
+    data = _small_stacks()
+    # The target of the last stack is not in the first stack
+    emphasis = [None, None, [[["box_2_3", "box_2_4", None],
+                              ["box_2_3", "box_2_9", None]]]]
+    layout = cebc.cascade_layout(data, emphasis, [None] * 3,
+                                 lod_threshold=1.)
+    assert len(_stack_boxes(layout, 0)) == 1
+
+
+def test_unknown_target_label_raises():
+    data = _small_stacks()
+    emphasis = [[[[0, 1, None], ["nope", None, None]]], None, None]
+    with pytest.raises(ValueError):
+        cebc.cascade_layout(data, emphasis, [None] * 3, lod_threshold=1.)
@@ -0,0 +1,76 @@
+import io
+import os
+
+import matplotlib
+import matplotlib.image
+import matplotlib.pyplot as plt
+import numpy
+import pytest
+
+import cascadedexplodingbarcharts as cebc
+
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline")
+
+# The chart of the README
+DATA = [[[2, "foo_1", "#3F8080"], [2, "foo_2", "#346080"],
+         [3, "foo_3", "#30A280"], [4, "bar_1", "#CFA080"],
+         [4, "bar_2", "#C08080"], [5, "bar_3", "#CB8060"]],
+        [[2, "foo_1", "#3F8080"], [2, "foo_2", "#346080"],
+         [3, "foo_3", "#30A280"], [0.4, "bar_1", "#CFA080"],
+         [0.4, "bar_2", "#C08080"], [0.5, "bar_3", "#CB8060"]],
+        [[2, "foo_1", "#3F8080"], [.2, "foo_2", "#346080"],
+         [.3, "foo_3", "#30A280"], [0.4, "bar_1", "#CFA080"],
+         [0.4, "bar_2", "#C08080"], [0.5, "bar_3", "#CB8060"]]]
+EMPHASIS = [[[[1, 2, "30"], [1, 2, "60"]], [[4, 5, "30"], [4, 5, "10"]]],
+            [[[1, 2, "40"], [1, 2, "10"]]],
+            [None]]
+BAR_LABELS = ["140", "90", "60"]
+
+
+@pytest.fixture(autouse=True)
+def cutoff(monkeypatch):
+    # The settings the baseline images were drawn with
+    monkeypatch.setitem(cebc.exp_barch_tp_set, "box_size_text_cutoff", 0.6)
+
+
+def _pixels(figure):
+    output = io.BytesIO()
+    figure.savefig(output, format="png")
+    plt.close(figure)
+    output.seek(0)
+    return matplotlib.image.imread(output)
+
+
+def _render(data, representation=None, batch=None):
+    figure, ax = plt.subplots()
+    cebc.cascaded_exploding_barcharts(ax, data, EMPHASIS, BAR_LABELS,
+                                      representation, batch)
+    return _pixels(figure)
+
+
+@pytest.mark.skipif(not matplotlib.__version__.startswith("3.11."),
+                    reason="baseline images drawn with matplotlib 3.11")
+@pytest.mark.parametrize("representation, image", [
+    (None, "default.png"), ("normalized", "normalized.png"),
+    ("percentage", "percentage.png")])
+def test_default_render_matches_baseline(representation, image):
+    """
+    The default chart is drawn pixel for pixel as the original implementation
+    """
+    expected = matplotlib.image.imread(os.path.join(BASELINE, image))
+    numpy.testing.assert_array_equal(_render(DATA, representation), expected)
+
+
+@pytest.mark.parametrize("batch", [None, "stack", "cascade"])
+def test_update_matches_fresh_render(batch):
+    changed = [[[value * 1.5 if idx == 0 else value, label, color]
+                for idx, (value, label, color) in enumerate(stack)]
+               for stack in DATA]
+    figure, ax = plt.subplots()
+    handle = cebc.cascaded_exploding_barcharts(
+        ax, DATA, EMPHASIS, BAR_LABELS, "percentage", batch)
+    figure.canvas.draw()
+    handle.update(changed)
+    numpy.testing.assert_array_equal(
+        _pixels(figure), _render(changed, "percentage", batch))
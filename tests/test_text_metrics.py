@@ -0,0 +1,34 @@
+import matplotlib.pyplot as plt
+import pytest
+
+import cascadedexplodingbarcharts as cebc
+
+
+@pytest.mark.parametrize("label, text_kwargs", [
+    ("label", {}),
+    ("a\nb", {}),
+    ("$x^2$", {}),
+    ("ÄÖ", {}),
+    ("a\nb", {"linespacing": 2.0}),
+    ("x\n\ny", {"fontsize": 7, "weight": "bold"}),
+    ("rotated", {"rotation": 30}),
+    ("vertical\nlabel", {"rotation": "vertical", "family": "serif"}),
+])
+@pytest.mark.parametrize("dpi", [72, 100, 150])
+def test_heights_match_window_extent(label, text_kwargs, dpi):
+    figure, ax = plt.subplots(dpi=dpi)
+    try:
+        text = ax.text(0, 0, label, **text_kwargs)
+        expected = text.get_window_extent(
+            figure.canvas.get_renderer()).height
+    finally:
+        plt.close(figure)
+    metrics = cebc.TextMetrics()
+    assert metrics.heights([label], text_kwargs, dpi)[0] == \
+        pytest.approx(expected, abs=1e-6)
+
+
+def test_heights_are_cached():
+    metrics = cebc.TextMetrics()
+    metrics.heights(["a", "b", "a"], {}, 100)
+    assert (metrics.hits, metrics.misses) == (1, 2)
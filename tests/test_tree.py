@@ -0,0 +1,102 @@
+import cascade_loader
+import cascade_tree
+
+
+def _profile():
+    return {"name": "main", "children": [
+        {"name": "solver", "value": 8., "children": [
+            {"name": "assemble", "value": 3.},
+            {"name": "solve", "value": 4.}]},
+        {"name": "io", "value": 2.}]}
+
+
+def test_children_of_a_stack_get_distinct_colors():
+    data, _, _ = cascade_tree.drilldown(_profile(), ["solver"])
+    colors = [entry[2] for entry in data[1] if entry[1] != "self"]
+    assert len(set(colors)) == len(colors)
+    assert set(colors) <= set(cascade_loader.category_palette)
+
+
+def test_colors_are_seeded_and_kept():
+    colors = {"solve": "#123456"}
+    data, _, _ = cascade_tree.drilldown(_profile(), ["solver"], colors=colors)
+    assert data[1][1] == [4., "solve", "#123456"]
+    assert set(colors) == {"solver", "io", "assemble", "solve"}
+
+
+def _wide_tree(listed):
+    """
+    A tree of depth 3 with 5 children per node, the names of the nodes whose
+    children are listed are added to listed
+    """
+    def node(name, depth):
+        return {"name": name, "value": 5. ** (3 - depth), "depth": depth}
+
+    def children(parent):
+        listed.append(parent["name"])
+        if parent["depth"] == 3:
+            return iter(())
+        return (node("%s.%d" % (parent["name"], idx), parent["depth"] + 1)
+                for idx in range(5))
+
+    return node("root", 0), children
+
+
+def test_nodes_off_the_path_are_never_listed():
+    listed = []
+    root, children = _wide_tree(listed)
+    data, emphasis, bar_labels = cascade_tree.drilldown(
+        root, ["root.2", "root.2.4"], children=children)
+    assert listed == ["root", "root.2", "root.2.4"]
+    assert bar_labels == ["root", "root.2", "root.2.4"]
+    assert [len(stack) for stack in data] == [5, 5, 5]
+    assert emphasis == [[[[2, 2, "20%"], [0, None, None]]],
+                        [[[4, 4, "20%"], [0, None, None]]], None]
+
+
+def test_nodes_without_value_are_aggregated():
+    profile = {"name": "main", "children": [
+        {"name": "a", "children": [{"name": "a1", "value": 1.},
+                                   {"name": "a2", "value": 2.}]},
+        {"name": "b", "value": 4.}]}
+    data, _, _ = cascade_tree.drilldown(profile, ["b"])
+    assert [entry[:2] for entry in data[0]] == [[3., "a"], [4., "b"]]
+
+
+def test_top_merges_the_smallest_children():
+    profile = {"name": "main", "children": [
+        {"name": "c%d" % idx, "value": float(idx)} for idx in range(1, 7)]}
+    data, emphasis, _ = cascade_tree.drilldown(profile, ["c1"], top=3)
+    # The two largest children, the expanded one (in tree order) and other
+    assert [entry[:2] for entry in data[0]] == \
+        [[1., "c1"], [5., "c5"], [6., "c6"], [2. + 3. + 4., "other"]]
+    assert emphasis[0][0][0][:2] == [0, 0]
+
+
+def test_self_box():
+    data, _, _ = cascade_tree.drilldown(_profile(), ["solver"])
+    # solver has 8, its children 7
+    assert data[1][-1][:2] == [1., "self"]
+    no_self, _, _ = cascade_tree.drilldown(_profile(), ["solver"],
+                                           self_label=None)
+    assert [entry[1] for entry in no_self[1]] == ["assemble", "solve"]
+
+
+def test_leaf_on_the_path():
+    data, emphasis, bar_labels = cascade_tree.drilldown(
+        _profile(), ["solver", "solve"])
+    assert bar_labels == ["main", "solver", "solve"]
+    # A leaf has no children, only its own time
+    assert [entry[:2] for entry in data[2]] == [[4., "self"]]
+    assert emphasis[2] is None
+
+
+def test_deep_chain():
+    root = node = {"name": "root"}
+    for idx in range(5000):
+        child = {"name": "n%d" % idx}
+        node["children"] = [child]
+        node = child
+    node["value"] = 2.
+    data, _, _ = cascade_tree.drilldown(root, ["n0"])
+    assert data[0][0][:2] == [2., "n0"]